@@ -14,9 +14,17 @@ bl_info = {
 
 _submodules = {
     "importer",
+    "asset_index",
     "bnd",
+    "catalog",
     "dcx",
+    "journal",
     "utils",
+    "jobs",
+    "mtd",
+    "texture_dump",
+    "tpf",
+    "workspace",
 }
 
 if "bpy" in locals():
@@ -25,14 +33,22 @@ if "bpy" in locals():
         if sm in locals():
             importlib.reload(locals()[sm])
 else:
-    from .importer import import_mesh
+    from .importer import (
+        MESH_KEY, PROXY_KEY, MeshMerger, find_imported_collection, import_mesh, import_mesh_steps,
+        load_full_textures, referenced_entries, remove_collection, unpack_archive)
+    from .asset_index import AssetIndex
+    from .flver import MeshFilter
+    from .jobs import ToolScheduler
+    from .journal import ImportJournal
+    from .mtd import MaterialLibrary
+    from .workspace import Workspace
 
-import bpy, gc
+import bpy, gc, time, traceback
 from os.path import realpath, dirname, join, isfile
 from shutil import copyfile
 from bpy_extras.io_utils import ImportHelper
 from pathlib import Path
-from bpy.props import StringProperty, CollectionProperty, BoolProperty
+from bpy.props import StringProperty, CollectionProperty, BoolProperty, IntProperty, EnumProperty, FloatVectorProperty
 
 class DCXBLENDER_PT_preferences(bpy.types.AddonPreferences):
     bl_idname = __name__
@@ -54,11 +70,46 @@ class DCXBLENDER_PT_preferences(bpy.types.AddonPreferences):
         description = "OPTIONAL: Path to the oo2core_6_win64.dll file.\nOnly necessary for Sekiro files",
         subtype = "FILE_PATH")
 
+    game_path: StringProperty(
+        name = "Game directory",
+        default = "",
+        description = "OPTIONAL: The game's install directory (e.g. DARK SOULS III/Game), unpacked with UXM.\nIndexed once so textures are found wherever they live in the game, and read for its material definitions",
+        subtype = "DIR_PATH")
+
+    memory_budget: IntProperty(
+        name = "Mesh memory budget (MB)",
+        default = 0,
+        min = 0,
+        description = "OPTIONAL: Cap on decoded mesh data held at once while importing.\nLower it if large maps run out of memory. 0 means no limit")
+
+    unpack_budget: IntProperty(
+        name = "Unpack directory budget (MB)",
+        default = 4096,
+        min = 0,
+        description = "OPTIONAL: Disk space extracted model files may use in the unpack directory.\nThe least recently imported files are removed beyond it,\nincluding textures no image in the open file uses. 0 means no limit")
+
+    max_tool_jobs: IntProperty(
+        name = "Concurrent tool jobs",
+        default = 0,
+        min = 0,
+        description = "OPTIONAL: How many Yabber/texconv processes may run at once.\n0 uses the number of CPU cores")
+
+    tool_timeout: IntProperty(
+        name = "Tool timeout (s)",
+        default = 600,
+        min = 0,
+        description = "OPTIONAL: Seconds before a Yabber/texconv process is stopped.\n0 means no limit")
+
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "unpack_path")
         layout.prop(self, "yabber_path")
         layout.prop(self, "dll_path")
+        layout.prop(self, "game_path")
+        layout.prop(self, "memory_budget")
+        layout.prop(self, "unpack_budget")
+        layout.prop(self, "max_tool_jobs")
+        layout.prop(self, "tool_timeout")
 
         has_set_unpack = (context.preferences.addons[__name__].preferences.unpack_path != "")
         has_yabber_installed = isfile(Path(join(context.preferences.addons[__name__].preferences.yabber_path, 'Yabber.exe')))
@@ -85,10 +136,80 @@ class DCXBLENDER_PT_importer(bpy.types.Operator, ImportHelper):
         default = False)
     clean_up_files: BoolProperty(
         name = "Clean up files after import", 
-        default = True)
+        description = "Delete the extracted files after import instead of keeping them for later imports of the same file",
+        default = False)
     import_rig: BoolProperty(
         name = "Import rig",
         default = False)
+    share_armatures: BoolProperty(
+        name = "Share armatures",
+        description = "Rig the selected files whose skeletons match (e.g. the parts of an armor set) to one armature, "
+            "adding the bones it is missing.\nOnly used with Import rig",
+        default = False)
+    texture_mip: IntProperty(
+        name = "Texture preview level",
+        description = "Import textures at a lower mip level, each level halving their width and height.\n0 imports full resolution. "
+            "Previews can be swapped for full resolution later with File > Import > FromSoftware Full Resolution Textures",
+        default = 0,
+        min = 0,
+        max = 4)
+    merge_meshes: EnumProperty(
+        name = "Merge meshes",
+        description = "Combine meshes sharing a material into one object, which keeps large maps responsive.\n"
+            "Each face's source mesh is kept in the \"source_mesh\" face attribute",
+        items = [
+            ("NONE", "Off", "One object per mesh"),
+            ("FILE", "Per file", "One object per material in each imported file"),
+            ("BATCH", "Across files", "One object per material for all selected files")],
+        default = "NONE")
+    import_dummies: EnumProperty(
+        name = "Dummies",
+        description = "Import the model's dummy polygons (attachment points for effects, hitboxes and so on) as one "
+            "point cloud object,\nwith their reference ids, directions and bones as point attributes",
+        items = [
+            ("NONE", "Off", "Skip dummies"),
+            ("POINTS", "Points", "One point cloud object per file"),
+            ("GIZMOS", "Gizmos", "Points drawn as cones along their forward direction with Geometry Nodes (Blender 3.2+)")],
+        default = "NONE")
+    use_region: BoolProperty(
+        name = "Only inside region",
+        description = "Import only meshes whose bounding box overlaps the region below (in Blender coordinates).\n"
+            "Other meshes, and files entirely outside it, are never read",
+        default = False)
+    region_min: FloatVectorProperty(
+        name = "Region min",
+        subtype = "XYZ",
+        default = (-10.0, -10.0, -10.0))
+    region_max: FloatVectorProperty(
+        name = "Region max",
+        subtype = "XYZ",
+        default = (10.0, 10.0, 10.0))
+    material_filter: StringProperty(
+        name = "Material filter",
+        description = "Import only meshes whose material name or mtd file matches one of these comma separated "
+            "patterns, e.g. \"*_Wall*, M[D]*.mtd\".\n* matches any text; brackets are matched literally. "
+            "Empty imports every material",
+        default = "")
+    weld_vertices: BoolProperty(
+        name = "Weld seam vertices",
+        description = "Merge the vertices the model splits along UV and normal seams into one, keeping UVs, colors "
+            "and custom normals per face corner.\nGives connected meshes that edit, subdivide and bevel cleanly",
+        default = False)
+    proxies: BoolProperty(
+        name = "Bounding box proxies",
+        description = "Only create a box per mesh from the model's header, without reading any geometry, "
+            "for laying out large maps.\nFile -> Import -> FromSoftware Proxy Geometry loads the real meshes later",
+        default = False)
+    update_existing: BoolProperty(
+        name = "Update existing imports",
+        description = "Re-importing a file updates its earlier import in place instead of adding a copy: "
+            "unchanged files are skipped and only changed meshes are rebuilt.\nNot used when merging meshes",
+        default = False)
+    resume: BoolProperty(
+        name = "Resume previous batch",
+        description = "Skip files the previous batch import from this directory completed, if their objects still exist.\n"
+            "Failed files are tried again. Each batch's outcome is kept in a journal in the unpack directory",
+        default = False)
     files: CollectionProperty(
         type=bpy.types.OperatorFileListElement, 
         options={'HIDDEN', 'SKIP_SAVE'})
@@ -99,7 +220,6 @@ class DCXBLENDER_PT_importer(bpy.types.Operator, ImportHelper):
         unpack_path = Path(context.preferences.addons[__name__].preferences.unpack_path)
         yabber_path = Path(context.preferences.addons[__name__].preferences.yabber_path)
         dll_path = (context.preferences.addons[__name__].preferences.dll_path)
-        sys_path = Path(dirname(realpath(__file__)))
 
         if dll_path != "":
             copyfile(Path(dll_path), yabber_path / "oo2core_6_win64.dll")
@@ -107,28 +227,313 @@ class DCXBLENDER_PT_importer(bpy.types.Operator, ImportHelper):
             print("No oo2core_6_win64.dll file found, Sekiro files will not work.")
         if unpack_path == "":
             raise Exception("Unpack path not set.\nSet it in the addon configuration.")
-        
+
+        self._steps = self.import_steps(context, unpack_path, yabber_path)
+        if context.window is None:
+            # Run from a script without a window to drive the modal loop
+            for file_index, file_count, file_name, stage, fraction, waiting in self._steps:
+                if waiting:
+                    time.sleep(0.01)
+            self.report_journal()
+            return {"FINISHED"}
+
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(self.time_slice, window = context.window)
+        window_manager.progress_begin(0, 1)
+        window_manager.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    # Seconds of Blender work done per timer event before the UI gets to redraw.
+    time_slice = 0.05
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            self._steps.close()
+            self.finish(context)
+            self.report({"WARNING"}, "Import cancelled")
+            return {"CANCELLED"}
+        if event.type != "TIMER":
+            # Undo would free the datablocks the import is still filling in
+            if event.type == "Z" and (event.ctrl or event.oskey):
+                return {"RUNNING_MODAL"}
+            return {"PASS_THROUGH"}
+
+        deadline = time.perf_counter() + self.time_slice
+        try:
+            while True:
+                file_index, file_count, file_name, stage, fraction, waiting = next(self._steps)
+                if waiting or time.perf_counter() > deadline:
+                    break
+        except StopIteration:
+            self.finish(context)
+            self.report_journal()
+            return {"FINISHED"}
+        except Exception as e:
+            self.finish(context)
+            self.report({"ERROR"}, str(e))
+            return {"CANCELLED"}
+
+        context.workspace.status_text_set(
+            f"Importing {file_name} ({file_index + 1}/{file_count}): {stage}. Press Esc to cancel")
+        context.window_manager.progress_update((file_index + fraction) / max(file_count, 1))
+        return {"RUNNING_MODAL"}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        context.window_manager.progress_end()
+        context.workspace.status_text_set(None)
+
+    def report_journal(self):
+        counts = self._journal.counts({file.name for file in self.files})
+        message = f"Imported {counts['completed']} files, {counts['failed']} failed, {counts['skipped']} skipped"
+        if counts["failed"]:
+            self.report({"WARNING"}, f"{message}. See {self._journal.path}")
+        else:
+            self.report({"INFO"}, message)
+
+    def import_steps(self, context, unpack_path, yabber_path):
+        """
+        Imports the selected files, yielding (file index, file count, file name, stage, fraction, waiting) between
+        steps (see import_mesh_steps). Closing it cancels the batch and removes the partially imported collections.
+
+        A file that fails is recorded in the batch's journal and the batch carries on with the next one.
+        """
+        preferences = context.preferences.addons[__name__].preferences
+        memory_budget = preferences.memory_budget * 2**20 or None
+        mesh_filter = None
+        patterns = [pattern.strip() for pattern in self.material_filter.split(",") if pattern.strip()]
+        if self.use_region or patterns:
+            region = None
+            if self.use_region:
+                # Blender's Z up to the FLVER's Y up
+                region = ((self.region_min[0], self.region_min[2], self.region_min[1]),
+                          (self.region_max[0], self.region_max[2], self.region_max[1]))
+            mesh_filter = MeshFilter(region, patterns)
+        workspace = Workspace(unpack_path, budget = preferences.unpack_budget * 2**20 or None,
+                              referenced = referenced_entries(unpack_path))
+        scheduler = ToolScheduler(
+            max_jobs = preferences.max_tool_jobs or None,
+            timeout = preferences.tool_timeout or None)
+        self._journal = ImportJournal(unpack_path, self.directory, resume = self.resume)
+        file_names = []
         for file in self.files:
-            import_mesh(
-                path = Path(self.directory),
-                file_name = file.name,
-                unpack_path = unpack_path,
-                yabber_path = yabber_path,
-                get_textures = self.get_textures,
-                clean_up_files = self.clean_up_files,
-                import_rig = self.import_rig)
-            gc.collect() # Probably not necessary, but in case Blender keeps the plugin running for whatever reason
-        return {"FINISHED"}
+            if self.resume and self._journal.is_done(file.name) and \
+                    find_imported_collection(str((Path(self.directory) / file.name).resolve())) is not None:
+                self._journal.record(file.name, "skipped")
+            else:
+                file_names.append(file.name)
+        file_name = file_names[0] if len(file_names) > 0 else ""
+
+        asset_index = None
+        material_library = None
+        unpack_jobs = {}
+        merged_collection = None
+        cancelled = False
+        try:
+            if self.get_textures and preferences.game_path != "":
+                asset_index = AssetIndex(unpack_path / "asset_index.sqlite")
+                scan = scheduler.submit(asset_index.scan, Path(preferences.game_path), workers = scheduler.max_jobs)
+                library = scheduler.submit(MaterialLibrary.load, Path(preferences.game_path), unpack_path)
+                for job in (scan, library):
+                    while not job.done():
+                        yield 0, len(file_names), file_name, "Indexing game files", 0.0, True
+                scan.result()
+                material_library = library.result()
+
+            # Unpack a few files ahead so Yabber runs while earlier files are parsed.
+            def queue_unpack(index):
+                if index < len(file_names) and index not in unpack_jobs:
+                    unpack_jobs[index] = scheduler.submit(
+                        unpack_archive, Path(self.directory), file_names[index], workspace, yabber_path, scheduler)
+
+            shared_armatures = [] if self.share_armatures else None
+            mesh_merger = None
+            if self.merge_meshes == "BATCH":
+                merged_collection = bpy.data.collections.new("Merged meshes")
+                context.scene.collection.children.link(merged_collection)
+                mesh_merger = MeshMerger(merged_collection)
+
+            for index, file_name in enumerate(file_names):
+                for ahead in range(index, index + scheduler.max_jobs):
+                    queue_unpack(ahead)
+                steps = import_mesh_steps(
+                    path = Path(self.directory),
+                    file_name = file_name,
+                    workspace = workspace,
+                    yabber_path = yabber_path,
+                    get_textures = self.get_textures,
+                    clean_up_files = self.clean_up_files,
+                    import_rig = self.import_rig,
+                    memory_budget = memory_budget,
+                    scheduler = scheduler,
+                    unpack_job = unpack_jobs.pop(index),
+                    asset_index = asset_index,
+                    material_library = material_library,
+                    texture_mip = self.texture_mip,
+                    merge_by_material = self.merge_meshes == "FILE",
+                    mesh_merger = mesh_merger,
+                    update_existing = self.update_existing,
+                    import_dummies = self.import_dummies,
+                    mesh_filter = mesh_filter,
+                    weld = self.weld_vertices,
+                    proxies = self.proxies,
+                    shared_armatures = shared_armatures)
+                try:
+                    for stage, fraction, waiting in steps:
+                        yield index, len(file_names), file_name, stage, fraction, waiting
+                except Exception as e:
+                    traceback.print_exc()
+                    self._journal.record(file_name, "failed", f"{type(e).__name__}: {e}")
+                else:
+                    self._journal.record(file_name, "completed")
+                finally:
+                    # On cancel, removes the file's partial collection before the scheduler shuts down below
+                    steps.close()
+                gc.collect() # Probably not necessary, but in case Blender keeps the plugin running for whatever reason
+            if mesh_merger is not None:
+                yield max(len(file_names) - 1, 0), len(file_names), "", "Merging", 1.0, False
+                mesh_merger.build()
+        except GeneratorExit:
+            cancelled = True
+            if merged_collection is not None:
+                remove_collection(merged_collection)
+            raise
+        finally:
+            for job in unpack_jobs.values():
+                job.cancel()
+            # Running tools are left to finish in the background when cancelled
+            scheduler.shutdown(wait = not cancelled)
+            if asset_index is not None and not cancelled:
+                asset_index.close()
     
+class DCXBLENDER_OT_full_textures(bpy.types.Operator):
+    bl_idname = "import_scene.dcx_full_textures"
+    bl_label = "FromSoftware Full Resolution Textures"
+    bl_description = "Replace preview textures of imported FromSoftware files with full resolution ones"
+    bl_options = {"REGISTER"}
+
+    def execute(self, context):
+        preferences = context.preferences.addons[__name__].preferences
+        scheduler = ToolScheduler(
+            max_jobs = preferences.max_tool_jobs or None,
+            timeout = preferences.tool_timeout or None)
+        try:
+            workspace = None
+            if preferences.unpack_path != "":
+                workspace = Workspace(preferences.unpack_path, budget = preferences.unpack_budget * 2**20 or None,
+                                      referenced = referenced_entries(preferences.unpack_path))
+            upgraded = load_full_textures(list(bpy.data.images), scheduler, workspace)
+        finally:
+            scheduler.shutdown()
+        self.report({"INFO"}, f"Loaded {upgraded} full resolution textures")
+        return {"FINISHED"}
+
+class DCXBLENDER_OT_load_proxies(bpy.types.Operator):
+    bl_idname = "import_scene.dcx_load_proxies"
+    bl_label = "FromSoftware Proxy Geometry"
+    bl_description = "Load the geometry of FromSoftware meshes imported as bounding box proxies"
+    bl_options = {"REGISTER", "UNDO"}
+
+    scope: EnumProperty(
+        name = "Proxies",
+        items = [
+            ("SELECTED", "Selected", "Load the selected proxies"),
+            ("VISIBLE", "Visible", "Load every proxy visible in the view layer")],
+        default = "SELECTED")
+    get_textures: BoolProperty(
+        name = "Import Textures",
+        default = True)
+    import_rig: BoolProperty(
+        name = "Import Rig",
+        default = False)
+    weld_vertices: BoolProperty(
+        name = "Weld seam vertices",
+        default = False)
+
+    def execute(self, context):
+        preferences = context.preferences.addons[__name__].preferences
+        if preferences.unpack_path == "":
+            raise Exception("Unpack path not set.\nSet it in the addon configuration.")
+        unpack_path = Path(preferences.unpack_path)
+        yabber_path = Path(preferences.yabber_path)
+
+        # Mesh indices to load, by source file
+        requested = {}
+        objects = context.selected_objects if self.scope == "SELECTED" else context.visible_objects
+        for obj in objects:
+            if PROXY_KEY in obj and MESH_KEY in obj:
+                requested.setdefault(obj[PROXY_KEY], set()).add(obj[MESH_KEY])
+        if not requested:
+            self.report({"WARNING"}, "No proxies to load")
+            return {"CANCELLED"}
+
+        workspace = Workspace(unpack_path, budget = preferences.unpack_budget * 2**20 or None,
+                              referenced = referenced_entries(unpack_path))
+        scheduler = ToolScheduler(
+            max_jobs = preferences.max_tool_jobs or None,
+            timeout = preferences.tool_timeout or None)
+        asset_index = None
+        material_library = None
+        loaded = 0
+        failed = 0
+        context.window_manager.progress_begin(0, len(requested))
+        try:
+            if self.get_textures and preferences.game_path != "":
+                asset_index = AssetIndex(unpack_path / "asset_index.sqlite")
+                asset_index.scan(Path(preferences.game_path), workers = scheduler.max_jobs)
+                material_library = MaterialLibrary.load(Path(preferences.game_path), unpack_path)
+            for count, (source, indices) in enumerate(sorted(requested.items())):
+                source = Path(source)
+                try:
+                    # Extracted files are kept, as nearby proxies are likely to be loaded next
+                    import_mesh(
+                        path = source.parent,
+                        file_name = source.name,
+                        workspace = workspace,
+                        yabber_path = yabber_path,
+                        get_textures = self.get_textures,
+                        clean_up_files = False,
+                        import_rig = self.import_rig,
+                        memory_budget = preferences.memory_budget * 2**20 or None,
+                        scheduler = scheduler,
+                        asset_index = asset_index,
+                        material_library = material_library,
+                        update_existing = True,
+                        mesh_filter = MeshFilter(indices = indices),
+                        weld = self.weld_vertices)
+                except Exception:
+                    traceback.print_exc()
+                    failed += 1
+                else:
+                    loaded += len(indices)
+                context.window_manager.progress_update(count + 1)
+        finally:
+            context.window_manager.progress_end()
+            scheduler.shutdown()
+            if asset_index is not None:
+                asset_index.close()
+
+        if failed:
+            self.report({"WARNING"}, f"Loaded {loaded} proxies, {failed} files failed. See the console")
+        else:
+            self.report({"INFO"}, f"Loaded {loaded} proxies")
+        return {"FINISHED"}
+
 def menu_import(self, context):
     self.layout.operator(DCXBLENDER_PT_importer.bl_idname)
+    self.layout.operator(DCXBLENDER_OT_full_textures.bl_idname)
+    self.layout.operator(DCXBLENDER_OT_load_proxies.bl_idname)
 
 def register():
     bpy.utils.register_class(DCXBLENDER_PT_importer)
+    bpy.utils.register_class(DCXBLENDER_OT_full_textures)
+    bpy.utils.register_class(DCXBLENDER_OT_load_proxies)
     bpy.types.TOPBAR_MT_file_import.append(menu_import)
     bpy.utils.register_class(DCXBLENDER_PT_preferences)
 
 def unregister():
     bpy.utils.unregister_class(DCXBLENDER_PT_preferences)
     bpy.types.TOPBAR_MT_file_import.remove(menu_import)
+    bpy.utils.unregister_class(DCXBLENDER_OT_load_proxies)
+    bpy.utils.unregister_class(DCXBLENDER_OT_full_textures)
     bpy.utils.unregister_class(DCXBLENDER_PT_importer)
@@ -0,0 +1,224 @@
+import hashlib, os, sqlite3, threading
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from pathlib import Path, PureWindowsPath
+from . import bnd, dcx
+from .tpf import TPF
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS containers (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT NOT NULL COLLATE NOCASE,
+    kind TEXT NOT NULL,
+    container TEXT NOT NULL,
+    member TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_name ON entries (name COLLATE NOCASE, kind);
+CREATE INDEX IF NOT EXISTS entries_container ON entries (container);
+"""
+
+# Files worth opening while scanning a game directory: those that can hold textures or models, compressed or not.
+# Animation, map layout, param and sound archives are never opened.
+CONTAINER_SUFFIXES = tuple(
+    suffix + compression
+    for suffix in (".tpf", ".texbnd", ".chrbnd", ".partsbnd", ".objbnd", ".mapbnd", ".flver")
+    for compression in ("", ".dcx"))
+
+# Containers stored per transaction while scanning, so an interrupted scan keeps what it indexed.
+COMMIT_BATCH = 64
+
+class AssetEntry:
+    """
+    A texture or model found by the asset index.
+
+    Attributes:
+        name (str): Texture name or model file stem, e.g. "c1234_a" or "c1234".
+        kind (str): "texture" or "model".
+        container (str): Path of the file on disk.
+        member (str): Name of the binder entry holding the asset, "" if the container is the asset's file itself.
+        offset (int): Offset of the asset within the (decompressed) member.
+        size (int): Size of the asset in bytes.
+        hash (str): sha1 of the asset's bytes.
+    """
+    def __init__(self, name, kind, container, member, offset, size, hash):
+        self.name = name
+        self.kind = kind
+        self.container = container
+        self.member = member
+        self.offset = offset
+        self.size = size
+        self.hash = hash
+
+class AssetIndex:
+    """
+    SQLite index of every texture and model inside a game install's
+    BND/TPF containers, so importing can find an asset by name without
+    guessing where it lives on disk.
+
+    scan() opens containers in parallel and only revisits files whose size or
+    modification time changed since the previous scan. Results are committed
+    in batches, so a scan that is interrupted picks up where it stopped.
+
+    Args:
+        db_path (Path): The index's SQLite file. Created if missing.
+    """
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents = True, exist_ok = True)
+        # Lookups may come from the scheduler's worker threads, all writes go through self._lock.
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread = False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def scan(self, game_path, workers = None):
+        """
+        Brings the index up to date with the containers below game_path.
+
+        Args:
+            game_path (Path): Root of the game install (the directory containing e.g. "chr" and "parts").
+            workers (int): Threads used to read containers. Defaults to the CPU count.
+
+        Returns:
+            tuple: Number of containers (re)indexed and number removed.
+        """
+        game_path = Path(game_path).resolve()
+        found = {}
+        for dirpath, subdirs, files in os.walk(game_path):
+            for file in files:
+                if file.lower().endswith(CONTAINER_SUFFIXES):
+                    path = os.path.join(dirpath, file)
+                    stat = os.stat(path)
+                    found[path] = (stat.st_size, stat.st_mtime_ns)
+
+        prefix = str(game_path) + os.sep
+        with self._lock:
+            known = {
+                path: (size, mtime_ns) for path, size, mtime_ns in self._db.execute(
+                    "SELECT path, size, mtime_ns FROM containers WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix))}
+        changed = [path for path, version in found.items() if known.get(path) != version]
+        removed = [path for path in known if path not in found]
+
+        with self._lock, self._db:
+            for path in removed:
+                self._forget(path)
+        with ThreadPoolExecutor(max_workers = workers or cpu_count()) as executor:
+            batch = []
+            for path, result in zip(changed, executor.map(scan_container, changed)):
+                batch.append((path, found[path], result))
+                if len(batch) >= COMMIT_BATCH:
+                    self._store(batch)
+                    batch = []
+            self._store(batch)
+        print(f"Asset index: {len(changed)} containers indexed, {len(removed)} removed, "
+              f"{len(found) - len(changed)} unchanged")
+        return len(changed), len(removed)
+
+    def find(self, name, kind):
+        """
+        Returns the AssetEntry named name (case insensitive), or None.
+        When several containers hold the same asset, the first one indexed wins.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, kind, container, member, offset, size, hash FROM entries "
+                "WHERE name = ? AND kind = ? ORDER BY rowid LIMIT 1", (name, kind)).fetchone()
+        return AssetEntry(*row) if row is not None else None
+
+    def find_texture(self, name):
+        return self.find(name, "texture")
+
+    def read(self, entries):
+        """
+        Reads the bytes of several assets, opening each container only once.
+
+        Args:
+            entries (list): AssetEntry objects returned by find().
+
+        Returns:
+            list: The bytes of each entry, in the same order.
+        """
+        results = [None] * len(entries)
+        by_container = {}
+        for position, entry in enumerate(entries):
+            by_container.setdefault(entry.container, []).append(position)
+        for container, positions in by_container.items():
+            data = dcx.read_file(container)
+            binder = bnd.read_binder(data) if bnd.is_binder(data) else None
+            files = {file.name: file for file in binder.files} if binder is not None else {}
+            members = {}
+            for position in positions:
+                entry = entries[position]
+                if entry.member not in members:
+                    members[entry.member] = binder.read(files[entry.member]) if entry.member else data
+                results[position] = bytes(members[entry.member][entry.offset:entry.offset + entry.size])
+        return results
+
+    def _store(self, batch):
+        # Replaces the rows of each (path, (size, mtime_ns), (entries, error)) in one transaction.
+        with self._lock, self._db:
+            for path, (size, mtime_ns), (entries, error) in batch:
+                self._forget(path)
+                self._db.execute(
+                    "INSERT INTO containers (path, size, mtime_ns, error) VALUES (?, ?, ?, ?)",
+                    (path, size, mtime_ns, error))
+                self._db.executemany(
+                    "INSERT INTO entries (name, kind, container, member, offset, size, hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(name, kind, path, member, offset, size, hash)
+                     for name, kind, member, offset, size, hash in entries])
+
+    def _forget(self, path):
+        # Must hold self._lock inside a transaction.
+        self._db.execute("DELETE FROM entries WHERE container = ?", (path,))
+        self._db.execute("DELETE FROM containers WHERE path = ?", (path,))
+
+def scan_container(path):
+    """
+    Lists the textures and models inside a file.
+
+    Returns:
+        tuple: A list of (name, kind, member, offset, size, hash) tuples, and an error message for files
+            that could not be read (None otherwise).
+    """
+    try:
+        data = dcx.read_file(path)
+        if bnd.is_binder(data):
+            binder = bnd.read_binder(data)
+            entries = []
+            for file in binder.files:
+                if file.name is None:
+                    continue
+                entries.extend((name, kind, file.name, offset, size, hash)
+                               for name, kind, _, offset, size, hash in scan_member(file.name, binder.read(file)))
+            return entries, None
+        return list(scan_member(path, data)), None
+    except dcx.UnsupportedCompression as e:
+        return [], str(e)
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+def scan_member(name, data):
+    """
+    Yields index rows for a single tpf or flver file, with member left empty.
+    """
+    file_name = PureWindowsPath(name).name
+    if data[:4] == b"TPF\0":
+        tpf = TPF(file_name, data = data)
+        tpf.unpack()
+        for texture_name, offset, texture in zip(tpf.filenames, tpf.data_offsets, tpf.textures):
+            yield texture_name.rstrip(), "texture", "", offset, len(texture), hashlib.sha1(texture).hexdigest()
+    elif data[:6] == b"FLVER\0":
+        yield file_name.split(".")[0], "model", "", 0, len(data), hashlib.sha1(data).hexdigest()
@@ -0,0 +1,176 @@
+import struct
+from . import dcx
+
+# Binder format flags, as read after bit order correction (see read_format).
+BIG_ENDIAN = 0x01
+IDS = 0x02
+NAMES1 = 0x04
+NAMES2 = 0x08
+LONG_OFFSETS = 0x10
+COMPRESSION = 0x20
+
+class BinderFile:
+    """
+    An entry of a BND3/BND4 binder.
+    """
+    def __init__(self, flags, id, name, data_offset, size, uncompressed_size):
+        self.flags = flags
+        self.id = id
+        self.name = name
+        self.data_offset = data_offset
+        self.size = size
+        self.uncompressed_size = uncompressed_size
+
+class Binder:
+    """
+    A BND3/BND4 container: a list of named files inside a single (usually DCX compressed) file.
+    """
+    def __init__(self, version, format, big_endian, unicode, files, data):
+        self.version = version
+        self.format = format
+        self.big_endian = big_endian
+        self.unicode = unicode
+        self.files = files
+        self.data = data
+
+    def read(self, file):
+        """
+        Returns the contents of one of the binder's files, decompressed if it is DCX compressed.
+        """
+        data = bytes(self.data[file.data_offset:file.data_offset + file.size])
+        if dcx.is_dcx(data):
+            return dcx.decompress(data)
+        return data
+
+    def find(self, name):
+        """
+        Returns the first file whose (case insensitive) name ends with name, or None.
+        """
+        name = name.lower()
+        for file in self.files:
+            if file.name is not None and file.name.lower().replace("\\", "/").endswith(name):
+                return file
+        return None
+
+def is_binder(data):
+    return data[:4] in (b"BND3", b"BND4")
+
+def read_binder(data):
+    """
+    Parses the header and file table of a BND3 or BND4 binder.
+
+    Args:
+        data (bytes): The decompressed binder.
+
+    Returns:
+        Binder: The binder, reading file contents from data on demand.
+    """
+    if data[:4] == b"BND3":
+        return read_bnd3(data)
+    if data[:4] == b"BND4":
+        return read_bnd4(data)
+    raise Exception(f"Not a binder: {bytes(data[:4])}")
+
+def header_size(data):
+    """
+    Returns the size of a binder's header, file table and names, i.e. how much of its start read_binder needs.
+
+    Args:
+        data (bytes): At least the first 0x40 bytes of the binder.
+    """
+    if data[:4] == b"BND3":
+        prefix = ">" if data[0x0D] != 0 else "<"
+        return struct.unpack_from(prefix + "i", data, 0x14)[0]
+    if data[:4] == b"BND4":
+        prefix = ">" if data[0x09] != 0 else "<"
+        return struct.unpack_from(prefix + "q", data, 0x28)[0]
+    raise Exception(f"Not a binder: {bytes(data[:4])}")
+
+def read_format(raw_format, bit_big_endian):
+    # Format bytes are usually stored with their bits reversed, see SoulsFormats' BinderCommon.ReadFormat.
+    if bit_big_endian or (raw_format & 0x01 and not raw_format & 0x80):
+        return raw_format
+    return int(f"{raw_format:08b}"[::-1], 2)
+
+def read_bnd3(data):
+    version = bytes(data[0x04:0x0C]).rstrip(b"\0").decode("ascii", errors = "replace")
+    bit_big_endian = data[0x0E] != 0
+    format = read_format(data[0x0C], bit_big_endian)
+    big_endian = data[0x0D] != 0 or bool(format & BIG_ENDIAN)
+    prefix = ">" if big_endian else "<"
+    file_count, = struct.unpack_from(prefix + "i", data, 0x10)
+
+    files = []
+    offset = 0x20
+    for _ in range(file_count):
+        flags = data[offset]
+        size, = struct.unpack_from(prefix + "i", data, offset + 0x04)
+        offset += 0x08
+        if format & LONG_OFFSETS:
+            data_offset, = struct.unpack_from(prefix + "q", data, offset)
+            offset += 8
+        else:
+            data_offset, = struct.unpack_from(prefix + "I", data, offset)
+            offset += 4
+        id = -1
+        if format & IDS:
+            id, = struct.unpack_from(prefix + "i", data, offset)
+            offset += 4
+        name = None
+        if format & (NAMES1 | NAMES2):
+            name_offset, = struct.unpack_from(prefix + "I", data, offset)
+            name = read_string(data, name_offset, False, big_endian)
+            offset += 4
+        uncompressed_size = -1
+        if format & COMPRESSION:
+            uncompressed_size, = struct.unpack_from(prefix + "i", data, offset)
+            offset += 4
+        files.append(BinderFile(flags, id, name, data_offset, size, uncompressed_size))
+    return Binder(version, format, big_endian, False, files, data)
+
+def read_bnd4(data):
+    big_endian = data[0x09] != 0
+    bit_big_endian = data[0x0A] == 0
+    prefix = ">" if big_endian else "<"
+    file_count, = struct.unpack_from(prefix + "i", data, 0x0C)
+    version = bytes(data[0x18:0x20]).rstrip(b"\0").decode("ascii", errors = "replace")
+    file_header_size, = struct.unpack_from(prefix + "q", data, 0x20)
+    unicode = data[0x30] != 0
+    format = read_format(data[0x31], bit_big_endian)
+
+    files = []
+    for index in range(file_count):
+        offset = 0x40 + index * file_header_size
+        flags = data[offset]
+        size, = struct.unpack_from(prefix + "q", data, offset + 0x08)
+        offset += 0x10
+        uncompressed_size = -1
+        if format & COMPRESSION:
+            uncompressed_size, = struct.unpack_from(prefix + "q", data, offset)
+            offset += 8
+        if format & LONG_OFFSETS:
+            data_offset, = struct.unpack_from(prefix + "q", data, offset)
+            offset += 8
+        else:
+            data_offset, = struct.unpack_from(prefix + "I", data, offset)
+            offset += 4
+        id = -1
+        if format & IDS:
+            id, = struct.unpack_from(prefix + "i", data, offset)
+            offset += 4
+        name = None
+        if format & (NAMES1 | NAMES2):
+            name_offset, = struct.unpack_from(prefix + "I", data, offset)
+            name = read_string(data, name_offset, unicode, big_endian)
+            offset += 4
+        files.append(BinderFile(flags, id, name, data_offset, size, uncompressed_size))
+    return Binder(version, format, big_endian, unicode, files, data)
+
+def read_string(data, offset, unicode, big_endian):
+    if unicode:
+        end = offset
+        while data[end:end + 2] != b"\0\0":
+            end += 2
+        return bytes(data[offset:end]).decode("utf_16_be" if big_endian else "utf_16_le")
+    end = data.index(b"\0", offset)
+    return bytes(data[offset:end]).decode("shift_jis")
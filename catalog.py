@@ -0,0 +1,195 @@
+"""
+Catalogs the FLVER models in a directory tree (e.g. a game install) from
+their headers, material and bone tables alone, without reading any mesh
+data. DCX files are only decompressed as far as those tables reach.
+
+Runs outside Blender:
+
+    python catalog.py <directory> <output.csv|.json|.sqlite> [--workers N]
+
+The SQLite output has a models table plus materials and bones tables keyed
+by model id, for queries such as which maps use a given MTD.
+"""
+import argparse, csv, io, json, os, sqlite3, struct, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PureWindowsPath
+
+if __package__ in (None, ""):
+    # Run as a script: load the add-on's modules as a package without
+    # executing its __init__, which needs Blender. Worker processes re-run
+    # this when they import the main module.
+    import types
+    _package = types.ModuleType("fromsoft_blender_importer")
+    _package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules.setdefault("fromsoft_blender_importer", _package)
+    from fromsoft_blender_importer import bnd, dcx, flver_utils
+else:
+    from . import bnd, dcx, flver_utils
+
+# Files worth opening while scanning.
+MODEL_SUFFIXES = (".dcx", ".bnd", ".flver", ".flv")
+
+FIELDS = (
+    "path", "member", "version", "dummy_count", "material_count", "bone_count", "mesh_count",
+    "vertex_buffer_count", "texture_count", "bounding_box_min", "bounding_box_max",
+    "materials", "mtd_paths", "bones", "error",
+)
+
+def scan_file(path):
+    """
+    Catalogs the FLVER models in a file, which may be a loose (DCX compressed) FLVER or a binder.
+
+    Returns:
+        list: A record (dict with FIELDS as keys) per model, or a single record with the error if the
+            file could not be read. Files without models give an empty list.
+    """
+    try:
+        with dcx.PrefixReader(path) as prefix:
+            prefix.ensure(0x80)
+            if prefix.data[:6] == b"FLVER\0":
+                return [summarize(path, "", prefix, 0)]
+            if not bnd.is_binder(prefix.data):
+                return []
+            prefix.ensure(0x40)
+            try:
+                prefix.ensure(bnd.header_size(prefix.data))
+                binder = bnd.read_binder(prefix.data)
+            except (ValueError, IndexError, UnicodeDecodeError):
+                binder = bnd.read_binder(prefix.read_all())  # Names past the reported header size
+            records = []
+            for file in binder.files:
+                if file.name is None or not file.name.lower().endswith((".flver", ".flv")):
+                    continue
+                if prefix.read(file.data_offset, 4) == b"DCX\0":
+                    data = dcx.decompress(prefix.read(file.data_offset, file.size))
+                    records.append(summarize(path, file.name, io.BytesIO(data), 0))
+                else:
+                    records.append(summarize(path, file.name, prefix, file.data_offset))
+            return records
+    except Exception as e:
+        return [record(path, "", error = f"{type(e).__name__}: {e}")]
+
+def summarize(path, member, source, offset):
+    """
+    Builds the record of the FLVER starting at offset, reading only its metadata.
+
+    Args:
+        source: A dcx.PrefixReader, or a BytesIO holding the whole FLVER.
+    """
+    if isinstance(source, dcx.PrefixReader):
+        # Everything before the FLVER's data offset is header, tables and strings
+        data_offset, = struct.unpack_from(
+            ">I" if source.read(offset + 6, 1) == b"B" else "<I", source.read(offset + 0x0C, 4))
+        fp = io.BytesIO(source.read(offset, data_offset))
+    else:
+        fp = source
+    header, counts, materials, bones = flver_utils.read_flver_summary(fp)
+    return record(
+        path, member,
+        version = f"0x{header.version:X}",
+        dummy_count = counts["dummies"],
+        material_count = counts["materials"],
+        bone_count = counts["bones"],
+        mesh_count = counts["meshes"],
+        vertex_buffer_count = counts["vertex_buffers"],
+        texture_count = counts["textures"],
+        bounding_box_min = [float(value) for value in header.bounding_box_min],
+        bounding_box_max = [float(value) for value in header.bounding_box_max],
+        materials = list(materials.names),
+        mtd_paths = [PureWindowsPath(mtd_path).name for mtd_path in materials.mtd_paths],
+        bones = list(bones.names))
+
+def record(path, member, **fields):
+    result = dict.fromkeys(FIELDS)
+    result.update(path = str(path), member = member, materials = [], mtd_paths = [], bones = [])
+    result.update(fields)
+    return result
+
+def find_files(root):
+    for dirpath, subdirs, files in os.walk(root):
+        for file in files:
+            if file.lower().endswith(MODEL_SUFFIXES):
+                yield os.path.join(dirpath, file)
+
+def scan(root, workers = None):
+    """
+    Catalogs every model below root using a process pool.
+
+    Args:
+        root (str): Directory to scan.
+        workers (int): Worker processes. Defaults to the CPU count.
+
+    Returns:
+        list: Records as returned by scan_file.
+    """
+    paths = sorted(find_files(root))
+    records = []
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        for file_records in executor.map(scan_file, paths, chunksize = 16):
+            records.extend(file_records)
+    return records
+
+def write_csv(records, output):
+    with open(output, "w", newline = "", encoding = "utf-8") as file:
+        writer = csv.DictWriter(file, FIELDS)
+        writer.writeheader()
+        for row in records:
+            writer.writerow({key: ";".join(map(str, value)) if isinstance(value, list) else value
+                             for key, value in row.items()})
+
+def write_json(records, output):
+    with open(output, "w", encoding = "utf-8") as file:
+        json.dump(records, file, indent = 1, ensure_ascii = False)
+
+def write_sqlite(records, output):
+    if os.path.exists(output):
+        os.remove(output)
+    db = sqlite3.connect(output)
+    with db:
+        db.executescript("""
+            CREATE TABLE models (
+                id INTEGER PRIMARY KEY, path TEXT, member TEXT, version TEXT, dummy_count INTEGER,
+                material_count INTEGER, bone_count INTEGER, mesh_count INTEGER, vertex_buffer_count INTEGER,
+                texture_count INTEGER, bounding_box_min TEXT, bounding_box_max TEXT, error TEXT);
+            CREATE TABLE materials (model_id INTEGER, name TEXT, mtd_path TEXT COLLATE NOCASE);
+            CREATE TABLE bones (model_id INTEGER, name TEXT);
+            CREATE INDEX materials_mtd ON materials (mtd_path);
+            CREATE INDEX bones_name ON bones (name);
+        """)
+        for row in records:
+            model_id = db.execute(
+                "INSERT INTO models (path, member, version, dummy_count, material_count, bone_count, mesh_count, "
+                "vertex_buffer_count, texture_count, bounding_box_min, bounding_box_max, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (row["path"], row["member"], row["version"], row["dummy_count"], row["material_count"],
+                 row["bone_count"], row["mesh_count"], row["vertex_buffer_count"], row["texture_count"],
+                 json.dumps(row["bounding_box_min"]), json.dumps(row["bounding_box_max"]), row["error"])).lastrowid
+            db.executemany("INSERT INTO materials (model_id, name, mtd_path) VALUES (?, ?, ?)",
+                           [(model_id, name, mtd_path) for name, mtd_path in zip(row["materials"], row["mtd_paths"])])
+            db.executemany("INSERT INTO bones (model_id, name) VALUES (?, ?)",
+                           [(model_id, name) for name in row["bones"]])
+    db.close()
+
+WRITERS = {".csv": write_csv, ".json": write_json, ".sqlite": write_sqlite, ".db": write_sqlite}
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Catalog FLVER models from their headers.")
+    parser.add_argument("directory", help = "Directory to scan, e.g. the game's install directory")
+    parser.add_argument("output", help = "Output file: .csv, .json or .sqlite")
+    parser.add_argument("--workers", type = int, default = None, help = "Worker processes (default: CPU count)")
+    args = parser.parse_args(args)
+
+    writer = WRITERS.get(os.path.splitext(args.output)[1].lower())
+    if writer is None:
+        parser.error("output must end in .csv, .json or .sqlite")
+    time_start = time.perf_counter()
+    records = scan(args.directory, args.workers)
+    writer(records, args.output)
+    failed = sum(1 for row in records if row["error"])
+    print(f"Cataloged {len(records) - failed} models ({failed} unreadable files) "
+          f"in {time.perf_counter() - time_start:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    from fromsoft_blender_importer.catalog import main as package_main
+    sys.exit(package_main())
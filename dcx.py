@@ -0,0 +1,127 @@
+import struct, zlib
+
+class UnsupportedCompression(Exception):
+    """
+    Raised for DCX files using a compression other than DFLT (e.g. Sekiro's
+    Oodle KRAK), which have to be unpacked with Yabber instead.
+    """
+
+def is_dcx(data):
+    return data[:4] == b"DCX\0"
+
+def read_header(data):
+    """
+    Parses a DCX header.
+
+    Args:
+        data (bytes): At least the first 0x4C bytes of the file.
+
+    Returns:
+        tuple: Compression format (e.g. b"DFLT"), uncompressed size, compressed size and the offset of the
+            compressed data.
+    """
+    assert data[:4] == b"DCX\0", "Not a DCX file"
+    assert data[0x18:0x1C] == b"DCS\0", "Bad DCX header"
+    uncompressed_size, compressed_size = struct.unpack_from(">II", data, 0x1C)
+    assert data[0x24:0x28] == b"DCP\0", "Bad DCX header"
+    compression = bytes(data[0x28:0x2C])
+    dca_offset = data.find(b"DCA\0", 0x2C)
+    assert dca_offset >= 0, "Bad DCX header"
+    dca_size, = struct.unpack_from(">I", data, dca_offset + 4)
+    return compression, uncompressed_size, compressed_size, dca_offset + dca_size
+
+def decompress(data, max_length = None):
+    """
+    Decompresses a DCX file.
+
+    Args:
+        data (bytes): The complete DCX file.
+        max_length (int): Stop after this many decompressed bytes, None for all.
+
+    Returns:
+        bytes: The decompressed contents.
+
+    Raises:
+        UnsupportedCompression: If the file is not DFLT compressed.
+    """
+    compression, uncompressed_size, compressed_size, data_offset = read_header(data)
+    if compression != b"DFLT":
+        raise UnsupportedCompression(f"Unsupported DCX compression: {compression.decode(errors = 'replace')}")
+    payload = memoryview(data)[data_offset:data_offset + compressed_size]
+    if max_length is None:
+        return zlib.decompress(payload)
+    return zlib.decompressobj().decompress(payload, max_length)
+
+def read_file(path):
+    """
+    Reads a file, decompressing it if it is DCX compressed.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if is_dcx(data):
+        return decompress(data)
+    return data
+
+class PrefixReader:
+    """
+    Gives access to the start of a file's contents, decompressing DCX files
+    incrementally and only as far as has been asked for, so headers can be
+    read without inflating whole archives.
+
+    Attributes:
+        data (bytearray): The contents decompressed so far.
+    """
+    chunk_size = 1 << 16
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        head = self.file.read(0x100)
+        self.data = bytearray()
+        self.remaining = None  # Compressed bytes left, None for uncompressed files
+        self._decompressor = None
+        if is_dcx(head):
+            compression, _, compressed_size, data_offset = read_header(head)
+            if compression != b"DFLT":
+                self.file.close()
+                raise UnsupportedCompression(f"Unsupported DCX compression: {compression.decode(errors = 'replace')}")
+            self.file.seek(data_offset)
+            self.remaining = compressed_size
+            self._decompressor = zlib.decompressobj()
+        else:
+            self.data += head
+
+    def ensure(self, length):
+        """
+        Decompresses until at least length bytes are available or the file ends.
+
+        Returns:
+            int: Number of bytes available.
+        """
+        while len(self.data) < length:
+            size = self.chunk_size if self.remaining is None else min(self.chunk_size, self.remaining)
+            chunk = self.file.read(size) if size > 0 else b""
+            if not chunk:
+                break
+            if self._decompressor is not None:
+                self.remaining -= len(chunk)
+                self.data += self._decompressor.decompress(chunk)
+            else:
+                self.data += chunk
+        return len(self.data)
+
+    def read(self, offset, length):
+        self.ensure(offset + length)
+        return bytes(self.data[offset:offset + length])
+
+    def read_all(self):
+        self.ensure(float("inf"))
+        return self.data
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
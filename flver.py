@@ -1,5 +1,12 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import Enum
-import struct
+import fnmatch
+import functools
+import hashlib
+import threading
+
+import numpy as np
 
 
 class Endianness(Enum):
@@ -29,48 +36,152 @@ class Header:
         self.unk68 = unk68
 
 
-class Dummy:
-    def __init__(self, position, color, forward, reference_id,
-                 parent_bone_index, upward, attach_bone_index, flag1,
-                 use_upward_vector, unk30, unk34):
-        self.position = position
-        self.color = color
-        self.forward = forward
-        self.reference_id = reference_id
-        self.parent_bone_index = parent_bone_index
-        self.upward = upward
-        self.attach_bone_index = attach_bone_index
-        self.flag1 = flag1
-        self.use_upward_vector = use_upward_vector
-        self.unk30 = unk30
-        self.unk34 = unk34
-
-
-class Material:
-    def __init__(self, name, mtd_path, texture_count, texture_index, flags,
-                 unk18):
-        self.name = name
-        self.mtd_path = mtd_path
-        self.texture_count = texture_count
-        self.texture_index = texture_index
-        self.flags = flags
-        self.unk18 = unk18
-
-
-class Bone:
-    def __init__(self, translation, name, rotation, parent_index, child_index,
-                 scale, next_sibling_index, previous_sibling_index,
-                 bounding_box_min, unk3C, bounding_box_max):
-        self.translation = translation
-        self.name = name
-        self.rotation = rotation
-        self.parent_index = parent_index
-        self.child_index = child_index
-        self.scale = scale
-        self.next_sibling_index = next_sibling_index
-        self.bounding_box_min = bounding_box_min
-        self.unk3C = unk3C
-        self.bounding_box_max = bounding_box_max
+def _scalar_column(name):
+    return property(lambda self: getattr(self._table, name)[self._index].item())
+
+
+def _vector_column(name):
+    return property(
+        lambda self: tuple(getattr(self._table, name)[self._index].tolist()))
+
+
+def _list_column(name):
+    return property(lambda self: getattr(self._table, name)[self._index])
+
+
+class _Row:
+    # Lightweight view onto a single record of a table. Attribute access reads
+    # straight from the table's columns.
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def index(self):
+        return self._index
+
+
+class _Table:
+    # Struct-of-arrays storage for a FLVER record table: one NumPy array per
+    # field (plain lists for strings), with row views handed out on indexing.
+    row_type = None
+
+    def __init__(self, count):
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f"{type(self).__name__} index out of range")
+        return self.row_type(self, index)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.row_type(self, index)
+
+
+class Dummy(_Row):
+    __slots__ = ()
+
+    position = _vector_column("positions")
+    color = _vector_column("colors")
+    forward = _vector_column("forwards")
+    reference_id = _scalar_column("reference_ids")
+    parent_bone_index = _scalar_column("parent_bone_indices")
+    upward = _vector_column("upwards")
+    attach_bone_index = _scalar_column("attach_bone_indices")
+    flag1 = _scalar_column("flags1")
+    use_upward_vector = _scalar_column("use_upward_vectors")
+    unk30 = _scalar_column("unk30")
+    unk34 = _scalar_column("unk34")
+
+
+class DummyTable(_Table):
+    row_type = Dummy
+
+    def __init__(self, positions, colors, forwards, reference_ids,
+                 parent_bone_indices, upwards, attach_bone_indices, flags1,
+                 use_upward_vectors, unk30, unk34):
+        super().__init__(len(positions))
+        self.positions = positions  # (N, 3) float32
+        self.colors = colors  # (N, 4) uint8, RGBA
+        self.forwards = forwards  # (N, 3) float32
+        self.reference_ids = reference_ids  # (N,) uint16
+        self.parent_bone_indices = parent_bone_indices  # (N,) int16
+        self.upwards = upwards  # (N, 3) float32
+        self.attach_bone_indices = attach_bone_indices  # (N,) int16
+        self.flags1 = flags1  # (N,) bool
+        self.use_upward_vectors = use_upward_vectors  # (N,) bool
+        self.unk30 = unk30  # (N,) uint32
+        self.unk34 = unk34  # (N,) uint32
+
+
+class Material(_Row):
+    __slots__ = ()
+
+    name = _list_column("names")
+    mtd_path = _list_column("mtd_paths")
+    texture_count = _scalar_column("texture_counts")
+    texture_index = _scalar_column("texture_indices")
+    flags = _scalar_column("flags")
+    unk18 = _scalar_column("unk18")
+
+
+class MaterialTable(_Table):
+    row_type = Material
+
+    def __init__(self, names, mtd_paths, texture_counts, texture_indices,
+                 flags, unk18):
+        super().__init__(len(names))
+        self.names = names  # list of str
+        self.mtd_paths = mtd_paths  # list of str
+        self.texture_counts = texture_counts  # (N,) uint32
+        self.texture_indices = texture_indices  # (N,) uint32
+        self.flags = flags  # (N,) uint32
+        self.unk18 = unk18  # (N,) uint32
+
+
+class Bone(_Row):
+    __slots__ = ()
+
+    translation = _vector_column("translations")
+    name = _list_column("names")
+    rotation = _vector_column("rotations")
+    parent_index = _scalar_column("parent_indices")
+    child_index = _scalar_column("child_indices")
+    scale = _vector_column("scales")
+    next_sibling_index = _scalar_column("next_sibling_indices")
+    previous_sibling_index = _scalar_column("previous_sibling_indices")
+    bounding_box_min = _vector_column("bounding_box_mins")
+    unk3C = _scalar_column("unk3C")
+    bounding_box_max = _vector_column("bounding_box_maxs")
+
+
+class BoneTable(_Table):
+    row_type = Bone
+
+    def __init__(self, translations, names, rotations, parent_indices,
+                 child_indices, scales, next_sibling_indices,
+                 previous_sibling_indices, bounding_box_mins, unk3C,
+                 bounding_box_maxs):
+        super().__init__(len(names))
+        self.translations = translations  # (N, 3) float32
+        self.names = names  # list of str
+        self.rotations = rotations  # (N, 3) float32, euler XYZ
+        self.parent_indices = parent_indices  # (N,) int16, -1 for roots
+        self.child_indices = child_indices  # (N,) int16
+        self.scales = scales  # (N, 3) float32
+        self.next_sibling_indices = next_sibling_indices  # (N,) int16
+        self.previous_sibling_indices = previous_sibling_indices  # (N,) int16
+        self.bounding_box_mins = bounding_box_mins  # (N, 3) float32
+        self.unk3C = unk3C  # (N,) uint32
+        self.bounding_box_maxs = bounding_box_maxs  # (N, 3) float32
 
 
 class Mesh:
@@ -81,13 +192,56 @@ class Mesh:
         DYNAMIC = 1
 
     def __init__(self, dynamic_mode, material_index, default_bone_index,
-                 bone_indices, index_buffer_indices, vertex_buffer_indices):
+                 bone_indices, index_buffer_indices, vertex_buffer_indices,
+                 bounding_box_min=None, bounding_box_max=None):
         self.dynamic_mode = dynamic_mode
         self.material_index = material_index
         self.default_bone_index = default_bone_index
         self.bone_indices = bone_indices
         self.index_buffer_indices = index_buffer_indices
         self.vertex_buffer_indices = vertex_buffer_indices
+        # (3,) float32 each, None when the file stores no bounding box
+        self.bounding_box_min = bounding_box_min
+        self.bounding_box_max = bounding_box_max
+
+
+# Selects meshes by region, material and index from the FLVER metadata
+# alone, so read_flver can skip reading the buffers of everything else.
+# region is an axis-aligned (min, max) box in FLVER coordinates. Meshes
+# without a bounding box pass the region test. patterns are fnmatch patterns
+# matched case-insensitively against material names and MTD file names.
+# Square brackets in them match literally, as MTD names such as
+# "M[D]_Wall.mtd" use them. indices, if given, further limits the selection
+# to those mesh indices.
+class MeshFilter:
+    def __init__(self, region=None, patterns=(), indices=None):
+        self.region = None
+        if region is not None:
+            self.region = (np.asarray(region[0], np.float32),
+                           np.asarray(region[1], np.float32))
+        self.patterns = [pattern.lower().replace("[", "[[]")
+                         for pattern in patterns]
+        self.indices = None if indices is None else set(indices)
+
+    def accepts_box(self, box_min, box_max):
+        if self.region is None or box_min is None or box_max is None:
+            return True
+        return bool(np.all(np.asarray(box_min) <= self.region[1]) and
+                    np.all(np.asarray(box_max) >= self.region[0]))
+
+    def accepts_material(self, material):
+        if not self.patterns:
+            return True
+        names = (material.name.lower(),
+                 material.mtd_path.replace("\\", "/").rsplit("/", 1)[-1].lower())
+        return any(fnmatch.fnmatchcase(name, pattern)
+                   for pattern in self.patterns for name in names)
+
+    def accepts(self, mesh, material, index=None):
+        if self.indices is not None and index not in self.indices:
+            return False
+        return self.accepts_box(mesh.bounding_box_min, mesh.bounding_box_max) \
+            and self.accepts_material(material)
 
 
 class IndexBuffer:
@@ -112,24 +266,25 @@ class IndexBuffer:
         self.unk06 = unk06
         self.indices = indices
 
-    def _inflate(self, faces):
+    def _release(self):
+        self.indices = None
+
+    def _inflate(self):
+        # Returns the triangulated faces as an (N, 3) array.
+        indices = np.asarray(self.indices, dtype=np.int32)
         if self.primitive_mode == self.PrimitiveMode.TRIANGLES:
-            for i in range(0, len(self.indices), 3):
-                faces.append(tuple(self.indices[i:i + 3]))
-        else:
-            direction = -1
-            f1 = self.indices[0]
-            f2 = self.indices[1]
-            for i in range(2, len(self.indices)):
-                f3 = self.indices[i]
-                direction *= -1
-                if f1 != f2 and f2 != f3 and f3 != f1:
-                    if direction > 0:
-                        faces.append((f1, f2, f3))
-                    else:
-                        faces.append((f1, f3, f2))
-                f1 = f2
-                f2 = f3
+            return indices[:len(indices) - len(indices) % 3].reshape(-1, 3)
+
+        if len(indices) < 3:
+            return np.zeros((0, 3), np.int32)
+        f1 = indices[:-2]
+        f2 = indices[1:-1]
+        f3 = indices[2:]
+        faces = np.stack((f1, f2, f3), axis=1)
+        # Every other triangle of a strip has flipped winding
+        faces[1::2] = faces[1::2, [0, 2, 1]]
+        # Drop degenerate triangles used to stitch strips together
+        return faces[(f1 != f2) & (f2 != f3) & (f3 != f1)]
 
 
 class VertexBuffer:
@@ -141,37 +296,24 @@ class VertexBuffer:
         self.vertex_count = vertex_count
         self.buffer_data = buffer_data
 
-    def _inflate(self, vertices, struct, version):
+    def _release(self):
+        self.buffer_data = None
+
+    def _decode(self, struct, version, endianness):
+        # Decodes every member of the buffer into an array, returning
+        # (attribute type, array) pairs in struct order. Arrays are read-only
+        # as they may be shared between meshes.
         struct_size = sum(member.size() for member in struct)
         assert self.struct_size == struct_size
         assert len(self.buffer_data) % self.struct_size == 0
 
-        # For now, only select from a limited set of attributes: POSITION,
-        # BONE_WEIGHTS, BONE_INDICES, and UV.
-        struct_members = [
-            member for member in struct if member.attribute_type in {
-                VertexBufferStructMember.AttributeType.POSITION,
-                VertexBufferStructMember.AttributeType.BONE_WEIGHTS,
-                VertexBufferStructMember.AttributeType.BONE_INDICES,
-                VertexBufferStructMember.AttributeType.UV,
-            }
-        ]
-
-        attribute_map = {
-            VertexBufferStructMember.AttributeType.POSITION:
-            vertices.positions,
-            VertexBufferStructMember.AttributeType.BONE_WEIGHTS:
-            vertices.bone_weights,
-            VertexBufferStructMember.AttributeType.BONE_INDICES:
-            vertices.bone_indices,
-            VertexBufferStructMember.AttributeType.UV: 
-            vertices.uv,
-        }
-        for member in struct_members:
-            for i in range(self.vertex_count):
-                data = member._unpack(self.buffer_data, i * self.struct_size, version)
-                attribute_map[member.attribute_type].append(data)
-
+        attributes = []
+        for member in struct:
+            data = member._decode(self.buffer_data, self.vertex_count,
+                                  self.struct_size, version, endianness)
+            data.flags.writeable = False
+            attributes.append((member.attribute_type, data))
+        return attributes
 
 
 class VertexBufferStructMember:
@@ -253,73 +395,354 @@ class VertexBufferStructMember:
             return 16
         raise Exception(f"unknown size for data type: {self.data_type}")
 
-    def _unpack(self, buf, offset, version):
+    def _layout(self):
+        # (component dtype, component count) this member is stored as. Some
+        # data types are interpreted differently depending on the attribute.
+        T = self.DataType
+        A = self.AttributeType
+        if self.data_type in {T.FLOAT2, T.FLOAT3, T.FLOAT4}:
+            return "f4", self.size() // 4
+        if self.data_type == T.BYTE4A:
+            if self.attribute_type == A.BONE_WEIGHTS:
+                return "i1", 4
+            return "u1", 4
+        if self.data_type in {T.BYTE4B, T.BYTE4C, T.BYTE4E}:
+            return "u1", 4
+        if self.data_type == T.SHORT2_TO_FLOAT2:
+            if self.attribute_type == A.UV:
+                return "i2", 2
+            return "u1", 4
+        if self.data_type == T.UV:
+            return "i2", 2
+        if self.data_type == T.UV_PAIR:
+            return "i2", 4
+        if self.data_type == T.SHORT_BONE_INDICES:
+            return "u2", 4
+        if self.data_type == T.SHORT4_TO_FLOAT4A:
+            return "i2", 4
+        if self.data_type == T.SHORT4_TO_FLOAT4B:
+            if self.attribute_type == A.NORMAL:
+                return "u2", 4
+            return "i2", 4
+        raise Exception(f"unknown layout for data type: {self.data_type}")
+
+    def _decode(self, buf, vertex_count, struct_size, version, endianness):
+        # Reads this member for every vertex at once through a strided view
+        # over the buffer, then converts it to the attribute's working form:
+        #   POSITION, NORMAL:                   (N, 3) float32
+        #   TANGENT, BITANGENT, VERTEX_COLOR:   (N, 4) float32
+        #   BONE_WEIGHTS:                       (N, 4) float32
+        #   BONE_INDICES:                       (N, 4) int32
+        #   UV:                                 (N, 2) float32, or (N, 4) for
+        #                                       members holding a pair of UVs
+        #
+        # Components are read in the file's byte order; swapping, if any,
+        # happens in bulk during the conversion to native working arrays.
         if version >= 0x2000F:
             uv_divisor = 2048.0
         else:
             uv_divisor = 1024.0
-        offset += self.struct_offset
 
-        #print(f'Type: {self.data_type} | Attr: {self.attribute_type}')
-        
-        if self.data_type == self.DataType.FLOAT2:
-            return tuple(struct.unpack_from("ff", buf, offset))
-        if self.data_type == self.DataType.FLOAT3:
-            return tuple(struct.unpack_from("fff", buf, offset))
-        if self.data_type == self.DataType.FLOAT4:
-            return tuple(struct.unpack_from("ffff", buf, offset))
-        
-        if (self.data_type == self.DataType.BYTE4A):
-            weights = struct.unpack_from("bbbb", buf, offset)
-            return tuple(weight / 127.0 for weight in weights)
-        if (self.data_type == self.DataType.BYTE4B):
-                return tuple(struct.unpack_from("BBBB", buf, offset))
-        if (self.data_type == self.DataType.BYTE4C):
-            weights = struct.unpack_from("BBBB", buf, offset)
-            return tuple(weight / 255.0 for weight in weights)
-        
-        if (self.data_type == self.DataType.UV): 
-            uv = struct.unpack_from("hh", buf, offset)
-            return tuple(component / uv_divisor for component in uv)
-        if (self.data_type == self.DataType.UV_PAIR):
-            uv = struct.unpack_from("hhhh", buf, offset)
-            return tuple(component / uv_divisor for component in uv)
-        
-        raise Exception(f'Unsupported type {self.data_type}')
-
-        
-
-
-class Texture:
-    def __init__(self, path, type_name, scale, unk10, unk11, unk14, unk18,
+        T = self.DataType
+        A = self.AttributeType
+        component, count = self._layout()
+        if endianness == Endianness.BIG:
+            component = np.dtype(component).newbyteorder(">")
+        else:
+            component = np.dtype(component).newbyteorder("<")
+        raw = np.ndarray(shape=(vertex_count, count),
+                         dtype=component,
+                         buffer=buf,
+                         offset=self.struct_offset,
+                         strides=(struct_size, component.itemsize))
+
+        if self.attribute_type == A.BONE_INDICES:
+            return raw.astype(np.int32)
+
+        if component.kind == "f":
+            data = raw.astype(np.float32)
+        elif self.attribute_type == A.UV:
+            data = raw / np.float32(uv_divisor)
+        elif self.attribute_type == A.BONE_WEIGHTS:
+            data = raw / np.float32(np.iinfo(component).max)
+        elif self.attribute_type in {A.NORMAL, A.TANGENT, A.BITANGENT}:
+            # Unsigned components are biased around the middle of their range
+            if component.kind == "u":
+                middle = np.iinfo(component).max // 2
+                data = (raw - np.float32(middle)) / np.float32(middle)
+            else:
+                data = raw / np.float32(np.iinfo(component).max)
+            if self.data_type == T.SHORT2_TO_FLOAT2:
+                # Stored as W, Z, Y, X
+                data = data[:, ::-1]
+        elif self.attribute_type == A.VERTEX_COLOR:
+            data = raw / np.float32(255.0)
+        else:
+            raise Exception(f"Unsupported type {self.data_type} for "
+                            f"{self.attribute_type}")
+
+        if self.attribute_type in {A.POSITION, A.NORMAL}:
+            data = data[:, :3]
+        elif self.attribute_type == A.UV and data.shape[1] == 3:
+            data = data[:, :2]
+        elif self.attribute_type == A.UV and \
+                self.data_type == T.SHORT4_TO_FLOAT4B:
+            data = data[:, :2]
+        return np.ascontiguousarray(data, dtype=np.float32)
+
+
+class Texture(_Row):
+    __slots__ = ()
+
+    path = _list_column("paths")
+    type_name = _list_column("type_names")
+    scale = _vector_column("scales")
+    unk10 = _scalar_column("unk10")
+    unk11 = _scalar_column("unk11")
+    unk14 = _scalar_column("unk14")
+    unk18 = _scalar_column("unk18")
+    unk1C = _scalar_column("unk1C")
+
+
+class TextureTable(_Table):
+    row_type = Texture
+
+    def __init__(self, paths, type_names, scales, unk10, unk11, unk14, unk18,
                  unk1C):
-        self.path = path
-        self.type_name = type_name
-        self.scale = scale
-        self.unk10 = unk10
-        self.unk11 = unk11
-        self.unk14 = unk14
-        self.unk18 = unk18
-        self.unk1C = unk1C
+        super().__init__(len(paths))
+        self.paths = paths  # list of str
+        self.type_names = type_names  # list of str
+        self.scales = scales  # (N, 2) float32
+        self.unk10 = unk10  # (N,) uint8
+        self.unk11 = unk11  # (N,) bool
+        self.unk14 = unk14  # (N,) float32
+        self.unk18 = unk18  # (N,) float32
+        self.unk1C = unk1C  # (N,) float32
 
 
 class InflatedMesh:
     class Vertices:
         def __init__(self):
-            self.positions = []
-            self.bone_weights = []
-            self.bone_indices = []
-            self.uv = []
+            self.positions = np.zeros((0, 3), np.float32)
+            self.normals = np.zeros((0, 3), np.float32)
+            self.tangents = np.zeros((0, 4), np.float32)
+            self.bitangents = np.zeros((0, 4), np.float32)
+            self.colors = np.zeros((0, 4), np.float32)
+            self.bone_weights = np.zeros((0, 4), np.float32)
+            self.bone_indices = np.zeros((0, 4), np.int32)
+            self.uvs = []
+
+        @property
+        def uv(self):
+            if len(self.uvs) == 0:
+                return np.zeros((0, 2), np.float32)
+            return self.uvs[0]
+
+        def _add(self, attribute_type, data):
+            # UVs accumulate as layers, pairs being split in two; for other
+            # attributes the first member wins.
+            A = VertexBufferStructMember.AttributeType
+            if attribute_type == A.UV:
+                self.uvs.extend(data[:, i:i + 2]
+                                for i in range(0, data.shape[1], 2))
+                return
+            name = {
+                A.POSITION: "positions",
+                A.NORMAL: "normals",
+                A.TANGENT: "tangents",
+                A.BITANGENT: "bitangents",
+                A.VERTEX_COLOR: "colors",
+                A.BONE_WEIGHTS: "bone_weights",
+                A.BONE_INDICES: "bone_indices",
+            }[attribute_type]
+            if len(getattr(self, name)) == 0:
+                setattr(self, name, data)
 
     def __init__(self):
-        self.faces = []
+        self.faces = np.zeros((0, 3), np.int32)
         self.vertices = self.Vertices()
+        # Per face corner (faces.ravel() order) normals, tangents,
+        # bitangents, colors and UVs once weld_vertices has merged the
+        # vertices they were split over; None while they are per vertex.
+        self.loops = None
+
+    # Returns the per face corner attributes, gathering the named ones (and
+    # the UVs) from the vertices if the mesh has not been welded.
+    def loop_attributes(self, names=("normals", "tangents", "bitangents",
+                                     "colors")):
+        if self.loops is not None:
+            return self.loops
+        corners = self.faces.ravel()
+        loops = self.Vertices()
+        for name in names:
+            data = getattr(self.vertices, name)
+            if len(data) > 0:
+                setattr(loops, name, data[corners])
+        loops.uvs = [uv[corners] for uv in self.vertices.uvs]
+        return loops
+
+
+# Merges vertices that FLVER buffers split along UV, normal and material
+# seams: vertices whose positions agree to within tolerance and whose bone
+# weights and indices are identical become one. Faces are remapped and the
+# seam-split attributes (normals, tangents, bitangents, colors, UVs) move
+# to the per corner mesh.loops. Runs in O(n log n) by sorting quantized
+# keys with np.lexsort, without a Python loop over vertices.
+def weld_vertices(mesh, tolerance=1e-5):
+    vertices = mesh.vertices
+    if len(vertices.positions) == 0:
+        return mesh
+    keys = [np.round(np.asarray(vertices.positions, np.float64)
+                     / tolerance).astype(np.int64)]
+    if len(vertices.bone_weights) > 0:
+        keys.append(np.round(np.asarray(vertices.bone_weights, np.float64)
+                             * 65535).astype(np.int64))
+    if len(vertices.bone_indices) > 0:
+        keys.append(np.asarray(vertices.bone_indices, np.int64))
+    keys = np.hstack(keys)
+    order = np.lexsort(keys.T[::-1])
+    sorted_keys = keys[order]
+    starts = np.empty(len(order), bool)
+    starts[0] = True
+    np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1, out=starts[1:])
+    first = order[starts]
+    inverse = np.empty(len(order), np.int32)
+    inverse[order] = np.cumsum(starts, dtype=np.int32) - 1
+
+    welded = InflatedMesh()
+    welded.loops = mesh.loop_attributes()
+    welded.faces = inverse[mesh.faces]
+    welded.vertices.positions = vertices.positions[first]
+    if len(vertices.bone_weights) > 0:
+        welded.vertices.bone_weights = vertices.bone_weights[first]
+    if len(vertices.bone_indices) > 0:
+        welded.vertices.bone_indices = vertices.bone_indices[first]
+    return welded
+
+
+# Concatenates inflated meshes into one, offsetting each mesh's faces by the
+# vertex count of the meshes before it. Attributes some meshes lack are
+# filled with defaults (up normals, white colors, zeros otherwise) and UV
+# layers are padded to the largest layer count. Returns the mesh and, per
+# face, the index in meshes it came from.
+def concatenate_meshes(meshes):
+    merged = InflatedMesh()
+    counts = np.array([len(mesh.vertices.positions) for mesh in meshes],
+                      np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int32)
+    merged.faces = np.concatenate(
+        [mesh.faces + offset for mesh, offset in zip(meshes, offsets)]
+        or [np.zeros((0, 3), np.int32)]).astype(np.int32, copy=False)
+    sources = np.repeat(np.arange(len(meshes), dtype=np.int32),
+                        [len(mesh.faces) for mesh in meshes])
+
+    def fill(name, width, default, dtype):
+        parts = [getattr(mesh.vertices, name) for mesh in meshes]
+        if all(len(part) == 0 for part in parts):
+            return
+        setattr(merged.vertices, name, np.concatenate([
+            part if len(part) == count
+            else np.full((count, width), default, dtype)
+            for part, count in zip(parts, counts)]).astype(dtype, copy=False))
+
+    fill("positions", 3, 0.0, np.float32)
+    fill("normals", 3, (0.0, 1.0, 0.0), np.float32)
+    fill("tangents", 4, 0.0, np.float32)
+    fill("bitangents", 4, 0.0, np.float32)
+    fill("colors", 4, 1.0, np.float32)
+    fill("bone_weights", 4, 0.0, np.float32)
+    fill("bone_indices", 4, 0, np.int32)
+    layer_count = max((len(mesh.vertices.uvs) for mesh in meshes), default=0)
+    for layer in range(layer_count):
+        merged.vertices.uvs.append(np.concatenate([
+            mesh.vertices.uvs[layer] if layer < len(mesh.vertices.uvs)
+            else np.zeros((count, 2), np.float32)
+            for mesh, count in zip(meshes, counts)]).astype(np.float32,
+                                                         copy=False))
+
+    # Welded meshes keep corner attributes per loop, so the merged mesh
+    # does too once any of them is welded.
+    if any(mesh.loops is not None for mesh in meshes):
+        loops = [mesh.loop_attributes() for mesh in meshes]
+        loop_counts = [len(mesh.faces) * 3 for mesh in meshes]
+        merged.loops = InflatedMesh.Vertices()
+        for name, width, default in (("normals", 3, (0.0, 1.0, 0.0)),
+                                     ("tangents", 4, 0.0),
+                                     ("bitangents", 4, 0.0),
+                                     ("colors", 4, 1.0)):
+            parts = [getattr(loop, name) for loop in loops]
+            if all(len(part) == 0 for part in parts):
+                continue
+            setattr(merged.loops, name, np.concatenate([
+                part if len(part) == count
+                else np.full((count, width), default, np.float32)
+                for part, count in zip(parts, loop_counts)]).astype(
+                    np.float32, copy=False))
+        layer_count = max((len(loop.uvs) for loop in loops), default=0)
+        merged.loops.uvs = [np.concatenate([
+            loop.uvs[layer] if layer < len(loop.uvs)
+            else np.zeros((count, 2), np.float32)
+            for loop, count in zip(loops, loop_counts)]).astype(
+                np.float32, copy=False) for layer in range(layer_count)]
+    return merged, sources
+
+
+class DecodeCache:
+    # Memoizes decoded vertex buffers by (vertex buffer index, struct index),
+    # so meshes referencing the same buffer share one set of arrays. Safe to
+    # use from several threads: concurrent requests for the same key wait for
+    # the first decode instead of repeating it.
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = {}
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, decode):
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                self.misses += 1
+                entry = self._entries[key] = Future()
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                attributes = decode()
+            except BaseException as e:
+                entry.set_exception(e)
+                raise
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._sizes[key] = sum(
+                        data.nbytes for _, data in attributes)
+                    self.nbytes += self._sizes[key]
+            entry.set_result(attributes)
+        return entry.result()
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self.nbytes -= self._sizes.pop(key, 0)
+
+    def trim(self, budget):
+        # Drops the oldest decoded entries until the cache fits in budget
+        # bytes. Dropped buffers are decoded again if requested later.
+        with self._lock:
+            for key in list(self._sizes):
+                if self.nbytes <= budget:
+                    break
+                del self._entries[key]
+                self.nbytes -= self._sizes.pop(key)
 
 
 class Flver:
     def __init__(self, header, dummies, materials, bones, meshes,
                  index_buffers, vertex_buffers, vertex_buffer_structs,
-                 textures):
+                 textures, selected_mesh_indices=None):
         self.header = header
         self.dummies = dummies
         self.materials = materials
@@ -329,13 +752,157 @@ class Flver:
         self.vertex_buffers = vertex_buffers
         self.vertex_buffer_structs = vertex_buffer_structs
         self.textures = textures
+        # Meshes whose buffers were read (see MeshFilter); the others can
+        # be listed but not inflated.
+        if selected_mesh_indices is None:
+            selected_mesh_indices = list(range(len(meshes)))
+        self.selected_mesh_indices = selected_mesh_indices
+        self.decode_cache = DecodeCache()
 
     # For every mesh, combine all index buffers into a single index buffer and
     # all vertex buffer attributes into individual corresponding attribute
-    # lists.
-    def inflate(self):
+    # arrays. Vertex buffers shared between meshes are decoded once; the
+    # hit/miss counts are kept in self.decode_cache.
+    #
+    # Meshes are decoded concurrently when given an executor or more than one
+    # worker. Decoding is NumPy bound and releases the GIL, so threads scale;
+    # results are always returned in mesh order.
+    def inflate(self, executor=None, workers=None):
+        self.decode_cache = DecodeCache()
+        if executor is not None:
+            return list(executor.map(self._inflate_mesh, self.meshes))
+        if workers is not None and workers > 1 and len(self.meshes) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(self._inflate_mesh, self.meshes))
         return [self._inflate_mesh(mesh) for mesh in self.meshes]
 
+    # Streaming variant of inflate: yields (mesh index, mesh, inflated mesh)
+    # one at a time. Once the consumer asks for the next mesh, the raw index
+    # and vertex buffers no longer referenced by any later mesh are released
+    # (set to None) along with their cached decodes, so peak memory stays
+    # close to a single mesh.
+    #
+    # With an executor or workers, up to that many meshes are decoded ahead
+    # of the consumer. memory_budget (bytes) caps both the estimated size of
+    # that read-ahead and the decode cache. mesh_indices restricts decoding
+    # to those meshes, in ascending order; it defaults to the selected ones.
+    # With weld set, each mesh also goes through weld_vertices (with weld
+    # as the tolerance) on the decoding threads.
+    def iter_inflate(self, executor=None, workers=None, memory_budget=None,
+                     release=True, mesh_indices=None, weld=None):
+        self.decode_cache = DecodeCache()
+        inflate_mesh = self._inflate_mesh
+        if weld is not None:
+            inflate_mesh = functools.partial(self._inflate_welded_mesh,
+                                             tolerance=weld)
+        if mesh_indices is None:
+            selected = list(self.selected_mesh_indices)
+        else:
+            selected = sorted(set(mesh_indices))
+
+        # Release each buffer after the last mesh that uses it
+        last_use = {}
+        for position, mesh_index in enumerate(selected):
+            mesh = self.meshes[mesh_index]
+            for index in mesh.vertex_buffer_indices:
+                last_use[("vertex", index)] = position
+            for index in mesh.index_buffer_indices:
+                last_use[("index", index)] = position
+        releases = [[] for _ in selected]
+        for key, position in last_use.items():
+            releases[position].append(key)
+
+        own_executor = (executor is None and workers is not None
+                        and workers > 1)
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        lookahead = workers or (2 if executor is not None else 1)
+
+        pending = deque()
+        in_flight = 0
+        submitted = 0
+        try:
+            for position, mesh_index in enumerate(selected):
+                mesh = self.meshes[mesh_index]
+                if executor is None:
+                    inflated = inflate_mesh(mesh)
+                else:
+                    while submitted < len(selected) and \
+                            len(pending) < lookahead:
+                        next_mesh = self.meshes[selected[submitted]]
+                        estimate = self._estimate_nbytes(next_mesh)
+                        if pending and memory_budget is not None and \
+                                in_flight + estimate > memory_budget:
+                            break
+                        pending.append((executor.submit(
+                            inflate_mesh, next_mesh), estimate))
+                        in_flight += estimate
+                        submitted += 1
+                    future, estimate = pending.popleft()
+                    inflated = future.result()
+                    in_flight -= estimate
+
+                yield mesh_index, mesh, inflated
+                del inflated
+
+                if release:
+                    for kind, index in releases[position]:
+                        if kind == "index":
+                            self.index_buffers[index]._release()
+                            continue
+                        vertex_buffer = self.vertex_buffers[index]
+                        vertex_buffer._release()
+                        self.decode_cache.discard(
+                            (index, vertex_buffer.struct_index))
+                if memory_budget is not None:
+                    self.decode_cache.trim(memory_budget)
+        finally:
+            for future, _ in pending:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(wait=True)
+
+    # Hash of everything a mesh is built from: its raw index and vertex
+    # buffers with their layouts, and its material and bone indices. Meshes
+    # can be compared across versions of a file without decoding anything,
+    # so this must be called before iter_inflate releases the buffers.
+    def mesh_fingerprint(self, mesh):
+        digest = hashlib.sha1(repr((
+            mesh.material_index, mesh.default_bone_index,
+            list(mesh.bone_indices))).encode())
+        for index in mesh.index_buffer_indices:
+            index_buffer = self.index_buffers[index]
+            digest.update(repr((
+                sorted(flag.name for flag in index_buffer.detail_flags),
+                index_buffer.primitive_mode.name)).encode())
+            digest.update(np.ascontiguousarray(index_buffer.indices).tobytes())
+        for index in mesh.vertex_buffer_indices:
+            vertex_buffer = self.vertex_buffers[index]
+            struct = self.vertex_buffer_structs[vertex_buffer.struct_index]
+            digest.update(repr([
+                (member.struct_offset, member.data_type,
+                 member.attribute_type, member.index)
+                for member in struct]).encode())
+            digest.update(vertex_buffer.buffer_data)
+        return digest.hexdigest()
+
+    def _estimate_nbytes(self, mesh):
+        # Rough decoded size of a mesh: attributes widen to float32/int32,
+        # at most 4x their packed size.
+        vertex_bytes = sum(
+            len(self.vertex_buffers[index].buffer_data or b"")
+            for index in mesh.vertex_buffer_indices)
+        index_bytes = sum(
+            len(self.index_buffers[index].indices) * 4
+            for index in mesh.index_buffer_indices
+            if self.index_buffers[index].indices is not None)
+        return vertex_bytes * 4 + index_bytes
+
+    def _inflate_welded_mesh(self, mesh, tolerance):
+        inflated = self._inflate_mesh(mesh)
+        return weld_vertices(inflated, tolerance) if inflated is not None \
+            else None
+
     def _inflate_mesh(self, mesh):
         result = InflatedMesh()
 
@@ -347,17 +914,20 @@ class Flver:
         if len(index_buffers) == 0:
             return None
         assert len(index_buffers) == 1
-        index_buffers[0]._inflate(result.faces)
+        result.faces = index_buffers[0]._inflate()
 
         # Parse vertex buffer attributes
-        vertex_buffers = [
-            self.vertex_buffers[index] for index in mesh.vertex_buffer_indices
-        ]
-        assert len(vertex_buffers) > 0
-        for vertex_buffer in vertex_buffers:
+        assert len(mesh.vertex_buffer_indices) > 0
+        for index in mesh.vertex_buffer_indices:
+            vertex_buffer = self.vertex_buffers[index]
             struct = self.vertex_buffer_structs[vertex_buffer.struct_index]
-            vertex_buffer._inflate(vertices=result.vertices,
-                                   struct=struct,
-                                   version=self.header.version)
-
-        return result
\ No newline at end of file
+            attributes = self.decode_cache.get(
+                (index, vertex_buffer.struct_index),
+                lambda: vertex_buffer._decode(
+                    struct=struct,
+                    version=self.header.version,
+                    endianness=self.header.endianness))
+            for attribute_type, data in attributes:
+                result.vertices._add(attribute_type, data)
+
+        return result
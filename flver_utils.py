@@ -1,5 +1,6 @@
 import struct
 from collections import deque
+import numpy as np
 from . import flver
 
 class StructReader:
@@ -41,10 +42,24 @@ class StructReader:
             self.fp.seek(position, 0)
         return result
 
+    def read_array(self, dtype, count, offset=None):
+        # Bulk equivalent of read_struct: reads count records of a NumPy
+        # (structured) dtype in the file's byte order.
+        dtype = np.dtype(dtype)
+        if self.endianness == flver.Endianness.BIG:
+            dtype = dtype.newbyteorder(">")
+        elif self.endianness == flver.Endianness.LITTLE:
+            dtype = dtype.newbyteorder("<")
+        data = self.read(dtype.itemsize * count, offset)
+        return np.frombuffer(data, dtype, count)
+
     def read_string(self, offset=None):
         if self.text_encoding == flver.TextEncoding.UTF_16:
             terminator = b"\0\0"
-            encoding = "utf_16_le"
+            if self.endianness == flver.Endianness.BIG:
+                encoding = "utf_16_be"
+            else:
+                encoding = "utf_16_le"
         elif self.text_encoding == flver.TextEncoding.SHIFT_JIS:
             terminator = b"\0"
             encoding = "shift_jis"
@@ -64,101 +79,127 @@ class StructReader:
         return result
 
 
-def read_dummy(reader, header):
-    data = deque(reader.read_struct("fffBBBBfffHhfffh??IIII"))
-
-    position = (data.popleft(), data.popleft(), data.popleft())
+DUMMY_DTYPE = np.dtype([
+    ("position", "f4", 3),  # fff
+    ("color", "u1", 4),  # BBBB
+    ("forward", "f4", 3),  # fff
+    ("reference_id", "u2"),  # H
+    ("parent_bone_index", "i2"),  # h
+    ("upward", "f4", 3),  # fff
+    ("attach_bone_index", "i2"),  # h
+    ("flag1", "?"),  # ?
+    ("use_upward_vector", "?"),  # ?
+    ("unk30", "u4"),  # I
+    ("unk34", "u4"),  # I
+    ("unk38", "u4", 2),  # II
+])
+
+MATERIAL_DTYPE = np.dtype([
+    ("name_offset", "u4"),  # I
+    ("mtd_path_offset", "u4"),  # I
+    ("texture_count", "u4"),  # I
+    ("texture_index", "u4"),  # I
+    ("flags", "u4"),  # I
+    ("gx_offset", "u4"),  # TODO: gx offset (I)
+    ("unk18", "u4"),  # I
+    ("unk1C", "u4"),  # I
+])
+
+BONE_DTYPE = np.dtype([
+    ("translation", "f4", 3),  # fff
+    ("name_offset", "u4"),  # I
+    ("rotation", "f4", 3),  # fff
+    ("parent_index", "i2"),  # h
+    ("child_index", "i2"),  # h
+    ("scale", "f4", 3),  # fff
+    ("next_sibling_index", "i2"),  # h
+    ("previous_sibling_index", "i2"),  # h
+    ("bounding_box_min", "f4", 3),  # fff
+    ("unk3C", "u4"),  # I
+    ("bounding_box_max", "f4", 3),  # fff
+    ("padding", "u1", 0x34),
+])
+
+TEXTURE_DTYPE = np.dtype([
+    ("path_offset", "u4"),  # I
+    ("type_name_offset", "u4"),  # I
+    ("scale", "f4", 2),  # ff
+    ("unk10", "u1"),  # B
+    ("unk11", "?"),  # ?
+    ("unk12", "u1", 2),  # BB
+    ("unk14", "f4"),  # f
+    ("unk18", "f4"),  # f
+    ("unk1C", "f4"),  # f
+])
+
+
+def _column(data, field, dtype):
+    # Copy a field out of a structured record array into a native-order,
+    # contiguous column.
+    return np.ascontiguousarray(data[field], dtype=dtype)
+
+
+def _read_strings(reader, offsets):
+    return [reader.read_string(int(offset)) for offset in offsets]
+
+
+def read_dummies(reader, header, count):
+    data = reader.read_array(DUMMY_DTYPE, count)
+    assert not data["unk38"].any()
 
     # Upstream is uncertain about RGB ordering
     if header.version == 0x20010:
-        b = data.popleft()  # B
-        g = data.popleft()  # B
-        r = data.popleft()  # B
-        a = data.popleft()  # B
+        color_order = [2, 1, 0, 3]  # BGRA
     else:
-        a = data.popleft()  # B
-        r = data.popleft()  # B
-        g = data.popleft()  # B
-        b = data.popleft()  # B
-    color = (r, g, b, a)
-
-    forward = (data.popleft(), data.popleft(), data.popleft())  # fff
-    reference_id = data.popleft()  # H
-    parent_bone_index = data.popleft()  # h
-    upward = (data.popleft(), data.popleft(), data.popleft())  # fff
-    attach_bone_index = data.popleft()  # h
-    flag1 = data.popleft()  # ?
-    use_upward_vector = data.popleft()  # ?
-    unk30 = data.popleft()  # I
-    unk34 = data.popleft()  # I
-    assert data.popleft() == 0  # I
-    assert data.popleft() == 0  # I
-
-    return flver.Dummy(
-        position=position,
-        color=color,
-        forward=forward,
-        reference_id=reference_id,
-        parent_bone_index=parent_bone_index,
-        upward=upward,
-        attach_bone_index=attach_bone_index,
-        flag1=flag1,
-        use_upward_vector=use_upward_vector,
-        unk30=unk30,
-        unk34=unk34,
+        color_order = [1, 2, 3, 0]  # ARGB
+
+    return flver.DummyTable(
+        positions=_column(data, "position", np.float32),
+        colors=np.ascontiguousarray(data["color"][:, color_order],
+                                    dtype=np.uint8),
+        forwards=_column(data, "forward", np.float32),
+        reference_ids=_column(data, "reference_id", np.uint16),
+        parent_bone_indices=_column(data, "parent_bone_index", np.int16),
+        upwards=_column(data, "upward", np.float32),
+        attach_bone_indices=_column(data, "attach_bone_index", np.int16),
+        flags1=_column(data, "flag1", np.bool_),
+        use_upward_vectors=_column(data, "use_upward_vector", np.bool_),
+        unk30=_column(data, "unk30", np.uint32),
+        unk34=_column(data, "unk34", np.uint32),
     )
 
 
-def read_material(reader):
-    data = deque(reader.read_struct("IIIIIIII"))
-
-    name = reader.read_string(data.popleft())  # I
-    mtd_path = reader.read_string(data.popleft())  # I
-    texture_count = data.popleft()  # I
-    texture_index = data.popleft()  # I
-    flags = data.popleft()  # I
-    data.popleft()  # TODO: gx offset (I)
-    unk18 = data.popleft()  # I
-    assert data.popleft() == 0  # I
+def read_materials(reader, count):
+    data = reader.read_array(MATERIAL_DTYPE, count)
+    assert not data["unk1C"].any()
 
-    return flver.Material(
-        name=name,
-        mtd_path=mtd_path,
-        texture_count=texture_count,
-        texture_index=texture_index,
-        flags=flags,
-        unk18=unk18,
+    return flver.MaterialTable(
+        names=_read_strings(reader, data["name_offset"]),
+        mtd_paths=_read_strings(reader, data["mtd_path_offset"]),
+        texture_counts=_column(data, "texture_count", np.uint32),
+        texture_indices=_column(data, "texture_index", np.uint32),
+        flags=_column(data, "flags", np.uint32),
+        unk18=_column(data, "unk18", np.uint32),
     )
 
 
-def read_bone(reader):
-    data = deque(reader.read_struct("fffIfffhhfffhhfffIfff"))
-
-    translation = (data.popleft(), data.popleft(), data.popleft())  # fff
-    name = reader.read_string(data.popleft())  # I
-    rotation = (data.popleft(), data.popleft(), data.popleft())  # fff
-    parent_index = data.popleft()  # h
-    child_index = data.popleft()  # h
-    scale = (data.popleft(), data.popleft(), data.popleft())  # fff
-    next_sibling_index = data.popleft()  # h
-    previous_sibling_index = data.popleft()  # h
-    bounding_box_min = (data.popleft(), data.popleft(), data.popleft())  # fff
-    unk3C = data.popleft()  # I
-    bounding_box_max = (data.popleft(), data.popleft(), data.popleft())  # fff
-    assert reader.read(0x34) == b"\0" * 0x34
-
-    return flver.Bone(
-        translation=translation,
-        name=name,
-        rotation=rotation,
-        parent_index=parent_index,
-        child_index=child_index,
-        scale=scale,
-        next_sibling_index=next_sibling_index,
-        previous_sibling_index=previous_sibling_index,
-        bounding_box_min=bounding_box_min,
-        unk3C=unk3C,
-        bounding_box_max=bounding_box_max,
+def read_bones(reader, count):
+    data = reader.read_array(BONE_DTYPE, count)
+    assert not data["padding"].any()
+
+    return flver.BoneTable(
+        translations=_column(data, "translation", np.float32),
+        names=_read_strings(reader, data["name_offset"]),
+        rotations=_column(data, "rotation", np.float32),
+        parent_indices=_column(data, "parent_index", np.int16),
+        child_indices=_column(data, "child_index", np.int16),
+        scales=_column(data, "scale", np.float32),
+        next_sibling_indices=_column(data, "next_sibling_index", np.int16),
+        previous_sibling_indices=_column(data, "previous_sibling_index",
+                                         np.int16),
+        bounding_box_mins=_column(data, "bounding_box_min", np.float32),
+        unk3C=_column(data, "unk3C", np.uint32),
+        bounding_box_maxs=_column(data, "bounding_box_max", np.float32),
     )
 
 def read_mesh(reader):
@@ -173,7 +214,7 @@ def read_mesh(reader):
     assert data.popleft() == 0  # I
     default_bone_index = data.popleft()  # I
     bone_count = data.popleft()  # I
-    bounding_offset = data.popleft()  # TODO: bounding box offset (I)
+    bounding_offset = data.popleft()  # I
     bone_offset = data.popleft()  # I
     index_buffer_count = data.popleft()  # I
     index_buffer_offset = data.popleft()  # I
@@ -189,6 +230,11 @@ def read_mesh(reader):
                                               index_buffer_offset)
     vertex_buffer_indices = reader.read_struct("I" * vertex_buffer_count,
                                                vertex_buffer_offset)
+    bounding_box_min = bounding_box_max = None
+    if bounding_offset != 0:
+        bounds = reader.read_array("f4", 6, bounding_offset)
+        bounding_box_min = np.array(bounds[:3], dtype=np.float32)
+        bounding_box_max = np.array(bounds[3:], dtype=np.float32)
 
     return flver.Mesh(
         dynamic_mode=dynamic_mode,
@@ -197,10 +243,13 @@ def read_mesh(reader):
         bone_indices=bone_indices,
         index_buffer_indices=index_buffer_indices,
         vertex_buffer_indices=vertex_buffer_indices,
+        bounding_box_min=bounding_box_min,
+        bounding_box_max=bounding_box_max,
     )
 
 
-def read_index_buffer(reader, header, data_offset):
+def read_index_buffer(reader, header, data_offset, load=True):
+    # With load False only the header is read and indices is None.
     data = deque(reader.read_struct("IBBHII"))
 
     detail_flags = set()
@@ -227,12 +276,14 @@ def read_index_buffer(reader, header, data_offset):
     if index_size == 0:
         index_size = header.default_vertex_index_size
 
-    if index_size == 16:
-        indices = reader.read_struct("H" * index_count,
-                                     data_offset + indices_offset)
+    if not load:
+        indices = None
+    elif index_size == 16:
+        indices = reader.read_array("u2", index_count,
+                                    data_offset + indices_offset)
     elif index_size == 32:
-        indices = reader.read_struct("I" * index_count,
-                                     data_offset + indices_offset)
+        indices = reader.read_array("u4", index_count,
+                                    data_offset + indices_offset)
 
     return flver.IndexBuffer(
         detail_flags=detail_flags,
@@ -243,7 +294,8 @@ def read_index_buffer(reader, header, data_offset):
     )
 
 
-def read_vertex_buffer(reader, data_offset):
+def read_vertex_buffer(reader, data_offset, load=True):
+    # With load False only the header is read and buffer_data is None.
     data = deque(reader.read_struct("IIIIIIII"))
 
     buffer_index = data.popleft()  # I
@@ -256,7 +308,9 @@ def read_vertex_buffer(reader, data_offset):
     buffer_offset = data.popleft()  # I
 
     # Read buffer data
-    buffer_data = reader.read(buffer_length, data_offset + buffer_offset)
+    buffer_data = None
+    if load:
+        buffer_data = reader.read(buffer_length, data_offset + buffer_offset)
 
     return flver.VertexBuffer(
         buffer_index=buffer_index,
@@ -307,141 +361,185 @@ def read_vertex_buffer_structs(reader):
     reader.seek(position)
     return result
 
-def read_texture(reader):
-    data = deque(reader.read_struct("IIffB?BBfff"))
+def read_textures(reader, count):
+    data = reader.read_array(TEXTURE_DTYPE, count)
+    assert np.isin(data["unk10"], (0, 1, 2)).all()
+    assert not data["unk12"].any()
+
+    return flver.TextureTable(
+        paths=_read_strings(reader, data["path_offset"]),
+        type_names=_read_strings(reader, data["type_name_offset"]),
+        scales=_column(data, "scale", np.float32),
+        unk10=_column(data, "unk10", np.uint8),
+        unk11=_column(data, "unk11", np.bool_),
+        unk14=_column(data, "unk14", np.float32),
+        unk18=_column(data, "unk18", np.float32),
+        unk1C=_column(data, "unk1C", np.float32),
+    )
+
+
+def read_header(reader):
+    # Reads the FLVER header from the start of the file. Returns the header,
+    # the offset of the buffer data (everything before it is metadata) and
+    # the sizes of the tables that follow the header.
+
+    # Read until endianness
+    data = deque(reader.read_struct("6s2s"))
+    assert data.popleft() == b"FLVER\0"
+    endianness = flver.Endianness(data.popleft())
+    reader.endianness = endianness
+
+    data = deque(
+        reader.read_struct("IIIIIIIIffffffIIBB?BIIIIBBBBIIIIIIII"))
+    # Gundam Unicorn: 0x20005, 0x2000E
+    # DS1: 2000C, 2000D
+    # DS2 NT: 2000F, 20010
+    # DS2: 20010, 20009 (armor 9320)
+    # SFS: 20010
+    # BB:  20013, 20014
+    # DS3: 20013, 20014
+    # SDT: 2001A, 20016 (test chr)
+    version = data.popleft()  # I
+    assert version in {
+        0x20005, 0x20009, 0x2000C, 0x2000D, 0x2000E, 0x2000F, 0x20010,
+        0x20013, 0x20014, 0x20016, 0x2001A
+    }
+
+    data_offset = data.popleft()  # I
+    assert data.popleft() >= 0  # data length (I)
+    dummy_count = data.popleft()  # I
+    material_count = data.popleft()  # I
+    bone_count = data.popleft()  # I
+    mesh_count = data.popleft()  # I
+    vertex_buffer_count = data.popleft()  # I
+
+    # fff
+    bounding_box_min = (data.popleft(), data.popleft(), data.popleft())
+    # fff
+    bounding_box_max = (data.popleft(), data.popleft(), data.popleft())
 
-    path = reader.read_string(data.popleft())  # I
-    type_name = reader.read_string(data.popleft())  # I
-    scale = (data.popleft(), data.popleft())  # ff
-    unk10 = data.popleft()  # B
-    assert unk10 in {0, 1, 2}
-    unk11 = data.popleft()  # ?
+    assert data.popleft() >= 0  # Face count of main mesh (I)
+    assert data.popleft() >= 0  # Total face count of all meshes (I)
+
+    default_vertex_index_size = data.popleft()  # B
+    assert default_vertex_index_size in {0, 8, 16, 32}
+    text_encoding = flver.TextEncoding(data.popleft())  # B
+    reader.text_encoding = text_encoding
+    unk4A = data.popleft()  # ?
+    assert data.popleft() == 0  # B
+
+    unk4C = data.popleft()  # I
+    index_buffer_count = data.popleft()  # I
+    vertex_buffer_struct_count = data.popleft()  # I
+    texture_count = data.popleft()  # I
+
+    unk5C = data.popleft()  # B
+    unk5D = data.popleft()  # B
     assert data.popleft() == 0  # B
     assert data.popleft() == 0  # B
-    unk14 = data.popleft()  # f
-    unk18 = data.popleft()  # f
-    unk1C = data.popleft()  # f
-
-    return flver.Texture(
-        path=path,
-        type_name=type_name,
-        scale=scale,
-        unk10=unk10,
-        unk11=unk11,
-        unk14=unk14,
-        unk18=unk18,
-        unk1C=unk1C,
-    )
 
+    assert data.popleft() == 0  # I
+    assert data.popleft() == 0  # I
+    unk68 = data.popleft()  # I
+    assert unk68 in {0, 1, 2, 3, 4}
+    assert data.popleft() == 0  # I
+    assert data.popleft() == 0  # I
+    assert data.popleft() == 0  # I
+    assert data.popleft() == 0  # I
+    assert data.popleft() == 0  # I
+
+    header = flver.Header(
+        endianness=endianness,
+        version=version,
+        bounding_box_min=bounding_box_min,
+        bounding_box_max=bounding_box_max,
+        default_vertex_index_size=default_vertex_index_size,
+        text_encoding=text_encoding,
+        unk4A=unk4A,
+        unk4C=unk4C,
+        unk5C=unk5C,
+        unk5D=unk5D,
+        unk68=unk68,
+    )
 
-def read_flver(file_name):
+    counts = {
+        "dummies": dummy_count,
+        "materials": material_count,
+        "bones": bone_count,
+        "meshes": mesh_count,
+        "index_buffers": index_buffer_count,
+        "vertex_buffers": vertex_buffer_count,
+        "vertex_buffer_structs": vertex_buffer_struct_count,
+        "textures": texture_count,
+    }
+    return header, data_offset, counts
+
+
+def read_flver_summary(fp):
+    # Reads only the header and the material and bone tables, for
+    # cataloguing files without touching mesh data. fp only needs to hold
+    # the metadata before the header's data offset.
+    reader = StructReader(fp)
+    header, data_offset, counts = read_header(reader)
+    reader.seek(reader.tell() + DUMMY_DTYPE.itemsize * counts["dummies"])
+    materials = read_materials(reader, counts["materials"])
+    bones = read_bones(reader, counts["bones"])
+    return header, counts, materials, bones
+
+
+def read_flver(file_name, mesh_filter=None, load_buffers=True):
+    # mesh_filter (flver.MeshFilter) selects the meshes to read; the index
+    # and vertex buffers only used by other meshes are never read. If the
+    # file's own bounding box is outside the filter's region, no buffers are
+    # read at all. Without load_buffers only the header and tables are read,
+    # e.g. for bounding box proxies.
     with open(file_name, 'rb') as fp:
         reader = StructReader(fp)
-
-        # Read until endianness
-        data = deque(reader.read_struct("6s2s"))
-        assert data.popleft() == b"FLVER\0"
-        endianness = flver.Endianness(data.popleft())
-        reader.endianness = endianness
-
-        data = deque(
-            reader.read_struct("IIIIIIIIffffffIIBB?BIIIIBBBBIIIIIIII"))
-        # Gundam Unicorn: 0x20005, 0x2000E
-        # DS1: 2000C, 2000D
-        # DS2 NT: 2000F, 20010
-        # DS2: 20010, 20009 (armor 9320)
-        # SFS: 20010
-        # BB:  20013, 20014
-        # DS3: 20013, 20014
-        # SDT: 2001A, 20016 (test chr)
-        version = data.popleft()  # I
-        assert version in {
-            0x20005, 0x20009, 0x2000C, 0x2000D, 0x2000E, 0x2000F, 0x20010,
-            0x20013, 0x20014, 0x20016, 0x2001A
-        }
-
-        data_offset = data.popleft()  # I
-        assert data.popleft() >= 0  # data length (I)
-        dummy_count = data.popleft()  # I
-        material_count = data.popleft()  # I
-        bone_count = data.popleft()  # I
-        mesh_count = data.popleft()  # I
-        vertex_buffer_count = data.popleft()  # I
-
-        # fff
-        bounding_box_min = (data.popleft(), data.popleft(), data.popleft())
-        # fff
-        bounding_box_max = (data.popleft(), data.popleft(), data.popleft())
-
-        assert data.popleft() >= 0  # Face count of main mesh (I)
-        assert data.popleft() >= 0  # Total face count of all meshes (I)
-
-        default_vertex_index_size = data.popleft()  # B
-        assert default_vertex_index_size in {0, 8, 16, 32}
-        text_encoding = flver.TextEncoding(data.popleft())  # B
-        reader.text_encoding = text_encoding
-        unk4A = data.popleft()  # ?
-        assert data.popleft() == 0  # B
-
-        unk4C = data.popleft()  # I
-        index_buffer_count = data.popleft()  # I
-        vertex_buffer_struct_count = data.popleft()  # I
-        texture_count = data.popleft()  # I
-
-        unk5C = data.popleft()  # B
-        unk5D = data.popleft()  # B
-        assert data.popleft() == 0  # B
-        assert data.popleft() == 0  # B
-
-        assert data.popleft() == 0  # I
-        assert data.popleft() == 0  # I
-        unk68 = data.popleft()  # I
-        assert unk68 in {0, 1, 2, 3, 4}
-        assert data.popleft() == 0  # I
-        assert data.popleft() == 0  # I
-        assert data.popleft() == 0  # I
-        assert data.popleft() == 0  # I
-        assert data.popleft() == 0  # I
-
-        header = flver.Header(
-            endianness=endianness,
-            version=version,
-            bounding_box_min=bounding_box_min,
-            bounding_box_max=bounding_box_max,
-            default_vertex_index_size=default_vertex_index_size,
-            text_encoding=text_encoding,
-            unk4A=unk4A,
-            unk4C=unk4C,
-            unk5C=unk5C,
-            unk5D=unk5D,
-            unk68=unk68,
-        )
-
-        dummies = []
-        for _ in range(dummy_count):
-            dummies.append(read_dummy(reader, header))
-        materials = []
-        for _ in range(material_count):
-            materials.append(read_material(reader))
-        bones = []
-        for _ in range(bone_count):
-            bones.append(read_bone(reader))
+        header, data_offset, counts = read_header(reader)
+        dummy_count = counts["dummies"]
+        material_count = counts["materials"]
+        bone_count = counts["bones"]
+        mesh_count = counts["meshes"]
+        index_buffer_count = counts["index_buffers"]
+        vertex_buffer_count = counts["vertex_buffers"]
+        vertex_buffer_struct_count = counts["vertex_buffer_structs"]
+        texture_count = counts["textures"]
+
+        dummies = read_dummies(reader, header, dummy_count)
+        materials = read_materials(reader, material_count)
+        bones = read_bones(reader, bone_count)
         meshes = []
         for _ in range(mesh_count):
             meshes.append(read_mesh(reader))
+
+        selected = list(range(mesh_count))
+        if mesh_filter is not None:
+            if mesh_filter.accepts_box(header.bounding_box_min,
+                                       header.bounding_box_max):
+                selected = [index for index, mesh in enumerate(meshes)
+                            if mesh_filter.accepts(
+                                mesh, materials[mesh.material_index], index)]
+            else:
+                selected = []
+        used_index_buffers = set()
+        used_vertex_buffers = set()
+        for mesh_index in selected if load_buffers else ():
+            used_index_buffers.update(meshes[mesh_index].index_buffer_indices)
+            used_vertex_buffers.update(
+                meshes[mesh_index].vertex_buffer_indices)
+
         index_buffers = []
-        for _ in range(index_buffer_count):
-            index_buffers.append(read_index_buffer(reader, header,
-                                                   data_offset))
+        for index in range(index_buffer_count):
+            index_buffers.append(read_index_buffer(
+                reader, header, data_offset, index in used_index_buffers))
         vertex_buffers = []
-        for _ in range(vertex_buffer_count):
-            vertex_buffers.append(read_vertex_buffer(reader, data_offset))
+        for index in range(vertex_buffer_count):
+            vertex_buffers.append(read_vertex_buffer(
+                reader, data_offset, index in used_vertex_buffers))
         vertex_buffer_structs = []
         for _ in range(vertex_buffer_struct_count):
             vertex_buffer_structs.append(read_vertex_buffer_structs(reader))
-        textures = []
-        for _ in range(texture_count):
-            textures.append(read_texture(reader))
+        textures = read_textures(reader, texture_count)
         # Ignore unknown Sekiro struct for now
 
     return flver.Flver(
@@ -454,4 +552,5 @@ def read_flver(file_name):
         vertex_buffers=vertex_buffers,
         vertex_buffer_structs=vertex_buffer_structs,
         textures=textures,
+        selected_mesh_indices=selected,
     )
\ No newline at end of file
@@ -1,15 +1,50 @@
-import bpy, bmesh, subprocess, time
-from os import listdir, mkdir, walk
+import bpy, copy, hashlib, json, re, time
+import numpy as np
+from os import cpu_count, walk
 from os.path import isfile, join, dirname, realpath
-from pathlib import Path
+from pathlib import Path, PureWindowsPath
+from .flver import concatenate_meshes
 from .flver_utils import read_flver
-from .tpf import TPF, convert_to_png
+from .jobs import ToolScheduler
+from .mtd import suffix_role, texture_role
+from .tpf import PNG_VERSION, TPF, convert_to_png
 from bpy.app.translations import pgettext
 from mathutils import Matrix, Vector
 from random import random
-from shutil import copyfile, rmtree
 
-def import_mesh(path, file_name, unpack_path, yabber_path, get_textures, clean_up_files, import_rig):
+def unpack_archive(path, file_name, workspace, yabber_path, scheduler):
+    """
+    Extracts a dcx/bnd file with Yabber into a workspace entry, reusing an
+    earlier extraction of the same, unchanged file when there is one.
+
+    Args:
+        path (str): Directory of the dcx file.
+        file_name (str): File name of the dcx file.
+        workspace (Workspace): Manages the unpack directory.
+        yabber_path (str): Directory containing Yabber.exe and Yabber.DCX.exe.
+        scheduler (ToolScheduler): Runs the Yabber process.
+
+    Returns:
+        tuple: The extracted directory (or the file itself for loose .flver files, which are read in place)
+            and the Yabber JobResult (None if nothing had to be extracted).
+    """
+    source = Path(path) / file_name
+    if file_name.endswith(".flver"):
+        return source, None
+
+    # Yabber reports most failures on stdout with a zero exit code, so failures
+    # surface as a missing flver in import_mesh rather than through check.
+    results = []
+    def extract(input_path, entry_dir):
+        tool = "Yabber.DCX.exe" if file_name.endswith(".flver.dcx") else "Yabber.exe"
+        results.append(scheduler.run([Path(yabber_path) / tool, input_path], check = False))
+    entry_dir = workspace.extract(source, extract)
+    return entry_dir, (results[0] if results else None)
+
+def import_mesh(path, file_name, workspace, yabber_path, get_textures, clean_up_files, import_rig, memory_budget=None,
+                scheduler=None, unpack_job=None, asset_index=None, material_library=None, texture_mip=0,
+                merge_by_material=False, mesh_merger=None, update_existing=False, import_dummies="NONE",
+                mesh_filter=None, weld=False, proxies=False, shared_armatures=None):
     """
     Converts a DCX file to flver and imports it into Blender.
     
@@ -17,36 +52,74 @@ def import_mesh(path, file_name, unpack_path, yabber_path, get_textures, clean_u
         path (str): Directory of the dcx file.
         file_name (str): File name of the dcx file
         base_name (Path): ID of the object.
-        unpack_path (str): Where the dcx file and textures will be unpacked to.
+        workspace (Workspace): Manages the directory the dcx file and textures are unpacked to.
         get_textures (bool): If to look for textures in {path} and convert them to png.
         yabber_dcx (bool): Whether to unpack with yabber.dcx.exe (true) or regular yabber.exe
+        memory_budget (int): Optional cap in bytes on decoded mesh data held at once.
+        scheduler (ToolScheduler): Runs external tools. A private one is used if not given.
+        unpack_job (Future): Already queued unpack_archive call for this file, if any.
+        asset_index (AssetIndex): Index of the game's textures. Textures are looked for next to the file if not given
+            or if the index knows none of them.
+        material_library (MaterialLibrary): The game's parsed MTDs, used to find each material's texture slots.
+        texture_mip (int): Import preview textures at this mip level, 0 for full resolution
+            (see load_full_textures).
+        merge_by_material (bool): Build one object per material instead of one per FLVER mesh.
+        mesh_merger (MeshMerger): Collects meshes to merge across several files; the caller builds it.
+            Implies merge_by_material.
+        update_existing (bool): Update an earlier, unmerged import of the same file in place instead of importing
+            it again. Unchanged files are skipped and only meshes whose data changed are rebuilt.
+        import_dummies (str): "POINTS" to import the FLVER's dummy polygons as a point cloud (see create_dummies),
+            "GIZMOS" to also draw them with Geometry Nodes, "NONE" to skip them.
+        mesh_filter (MeshFilter): Import only the meshes inside a region and/or with matching materials; the others'
+            buffers are never read. Files with no matching meshes are skipped.
+        weld (bool): Merge the vertices FLVER splits along UV and normal seams (see flver.weld_vertices), keeping
+            UVs, colors and normals per face corner.
+        proxies (bool): Only create bounding box placeholders for the meshes from the FLVER's header and mesh
+            tables (see create_proxies); their geometry is loaded later by importing again with update_existing.
+            Files that were already imported are left as they are.
+        shared_armatures (list): Armatures the file may share when its skeleton matches (see find_armature); the
+            caller keeps the list across a batch and new armatures are added to it. None gives each file its own.
 
     """
+    steps = import_mesh_steps(
+        path, file_name, workspace, yabber_path, get_textures, clean_up_files, import_rig, memory_budget, scheduler,
+        unpack_job, asset_index, material_library, texture_mip, merge_by_material, mesh_merger, update_existing,
+        import_dummies, mesh_filter, weld, proxies, shared_armatures)
+    for stage, fraction, waiting in steps:
+        if waiting:
+            time.sleep(0.01)
+
+def import_mesh_steps(path, file_name, workspace, yabber_path, get_textures, clean_up_files, import_rig,
+                      memory_budget=None, scheduler=None, unpack_job=None, asset_index=None, material_library=None,
+                      texture_mip=0, merge_by_material=False, mesh_merger=None, update_existing=False,
+                      import_dummies="NONE", mesh_filter=None, weld=False, proxies=False,
+                      shared_armatures=None):
+    """
+    import_mesh as a generator, for callers that keep Blender responsive
+    while importing (see DCXBLENDER_PT_importer.modal). Unpacking, parsing
+    and texture conversion run on the scheduler's threads; Blender data is
+    built between yields, at most one mesh at a time.
+
+    Closing the generator early, or an error, removes the file's partially
+    built collection (an existing import being updated is left as far as it got).
+
+    Yields:
+        tuple: Current stage (str), progress through the file from 0 to 1, and whether the import is waiting
+            on background work (so the caller can hand control back to Blender instead of resuming at once).
+    """
 
     print("Importing {} from {}".format(file_name, str(path)))
 
+    # An unshared scheduler's worker threads exit once it is garbage collected
+    if scheduler is None:
+        scheduler = ToolScheduler()
+    if unpack_job is None:
+        unpack_job = scheduler.submit(unpack_archive, path, file_name, workspace, yabber_path, scheduler)
+    tmp_path, unpack_result = yield from wait_for(unpack_job, "Unpacking", 0.0)
     base_name = file_name.split('.')[0]
-    try:
-        mkdir(unpack_path / Path(base_name))
-    except FileExistsError:
-        pass
-    tmp_path = Path(unpack_path / base_name)
-    copyfile( path / file_name, tmp_path / file_name)
-
-    if file_name.endswith(".flver.dcx"):
-        command = f'"{yabber_path}\\Yabber.DCX.exe" "{tmp_path}\\{file_name}"'
-    elif file_name.endswith(".flver"):
-        command = ""
-    else:
-        command = f'"{yabber_path}\\Yabber.exe" "{tmp_path}\\{file_name}"'
+    source = str((Path(path) / file_name).resolve())
 
-    p = subprocess.Popen(command, stderr = subprocess.PIPE, stdout = subprocess.PIPE)
-    while True:
-        out, err = p.communicate()
-        if p.returncode is not None: 
-            break # Prevents Yabber from holding up Blender if it fails unpacking.
-    
-    flver_path = None
+    flver_path = tmp_path if tmp_path.is_file() else None
     for dirpath, subdirs, files in walk(tmp_path):
         for x in files:
             if x.endswith(".flver") | x.endswith(".flv"):
@@ -54,116 +127,675 @@ def import_mesh(path, file_name, unpack_path, yabber_path, get_textures, clean_u
                 if file_name.endswith(".partsbnd.dcx"):
                     path = Path(dirpath)
     if flver_path == None:
+        workspace.discard(tmp_path)
+        if unpack_result is not None and not unpack_result.ok:
+            raise Exception(f"Failed to unpack {file_name}: {unpack_result.summary()}\n{unpack_result.stdout}")
         raise Exception(f"Unsupported file type: {file_name}")
 
+    # Merged objects mix meshes (and files), so they cannot be patched mesh by mesh
+    existing = None
+    if (update_existing or proxies) and not merge_by_material and mesh_merger is None:
+        existing = find_imported_collection(source)
+
     time_start = time.perf_counter()
+    collection = None
+    meshes = None
+    try:
+        if proxies:
+            if existing is not None:
+                print(f"{file_name} is already imported")
+                return
+            flver_data = yield from wait_for(
+                scheduler.submit(read_flver, flver_path, mesh_filter, False), "Reading", 0.1)
+            collection = bpy.data.collections.new(base_name)
+            collection[SOURCE_KEY] = source
+            bpy.context.scene.collection.children.link(collection)
+            create_proxies(base_name, collection, flver_data, source)
+            return
 
-    flver_data = read_flver(flver_path)
-    inflated_meshes = flver_data.inflate()
+        file_hash = yield from wait_for(scheduler.submit(file_sha1, flver_path), "Reading", 0.1)
+        if weld:
+            file_hash += "|weld"  # Welded and unwelded imports of a file differ
+        if existing is not None and existing.get(FILE_HASH_KEY) == file_hash and mesh_filter is None:
+            print(f"{file_name} is unchanged since it was imported")
+            return
+        flver_data = yield from wait_for(scheduler.submit(read_flver, flver_path, mesh_filter), "Reading", 0.1)
+        if len(flver_data.selected_mesh_indices) == 0:
+            print(f"No meshes of {file_name} match the filter")
+            return
 
-    collection = bpy.data.collections.new(base_name)
-    bpy.context.scene.collection.children.link(collection)
-    
-    # Create armature
+        # Textures are converted on the scheduler's threads while the meshes
+        # are built below; materials are attached once they are ready.
+        texture_job = None
+        if get_textures:
+            def convert_textures():
+                texture_path = None
+                if asset_index is not None:
+                    texture_path = import_indexed_textures(
+                        Path(source), base_name, flver_data, asset_index, workspace, scheduler, texture_mip)
+                if texture_path is None:
+                    texture_path = import_textures(path, base_name, workspace, yabber_path, scheduler, texture_mip)
+                return texture_path
+            texture_job = scheduler.submit(convert_textures)
+
+        materials = None  # By material index, once the textures are converted
+        waiting_objects = []  # (object, material index) waiting for materials
+        waiting_merges = []  # merger.add arguments waiting for materials, with a material index for the material
+        def materials_ready():
+            nonlocal materials
+            if materials is not None:
+                return True
+            if texture_job is not None and not texture_job.done():
+                return False
+            materials = {}
+            if texture_job is not None:
+                try:
+                    materials = create_flver_materials(base_name, flver_data, texture_job.result(), material_library)
+                except FileNotFoundError as fne:
+                    print(f"Texture file not found {fne}")
+            for obj, material_index in waiting_objects:
+                set_material(obj, materials.get(material_index))
+            for inflated_mesh, source_name, material_name, material_index, rig, bone_names in waiting_merges:
+                merger.add(inflated_mesh, source_name, material_name, materials.get(material_index), rig, bone_names)
+            waiting_objects.clear()
+            waiting_merges.clear()
+            return True
+
+        if existing is not None:
+            collection = existing
+        else:
+            collection = bpy.data.collections.new(base_name)
+            collection[SOURCE_KEY] = source
+            bpy.context.scene.collection.children.link(collection)
+
+        # Create armature, reusing the one of the import being updated if the skeleton still matches
+        if import_rig:
+            candidates = list(shared_armatures or ())
+            if existing is not None:
+                candidates += [obj for obj in collection.objects if obj.type == "ARMATURE"]
+            armature = find_armature(flver_data, candidates)
+            if armature is None:
+                armature = create_armature(base_name, collection, flver_data)
+                if shared_armatures is not None:
+                    shared_armatures.append(armature)
+            yield "Armature", 0.2, False
+
+        merger = mesh_merger
+        if merger is None and merge_by_material:
+            merger = MeshMerger(collection)
+
+        # Objects of an earlier import whose mesh fingerprint still matches are
+        # kept as they are; only their material and armature are refreshed.
+        # Meshes left out by mesh_filter are not compared, so their objects stay as they are.
+        fingerprints = {index: mesh_fingerprint(flver_data, flver_data.meshes[index], import_rig, weld)
+                        for index in flver_data.selected_mesh_indices}
+        objects = {}
+        if existing is not None:
+            old_armatures = {obj for obj in collection.objects if obj.type == "ARMATURE"}
+            for obj in list(collection.objects):
+                if MESH_KEY not in obj:
+                    # Merged meshes, or dummies when they are imported again, of an earlier import; rebuilt below
+                    if obj.type == "MESH" and (DUMMIES_KEY not in obj or import_dummies != "NONE"):
+                        remove_object(obj)
+                    continue
+                index = obj[MESH_KEY]
+                if index >= len(flver_data.meshes) or index in objects:
+                    remove_object(obj)
+                    continue
+                objects[index] = obj
+                if import_rig:
+                    attach_armature(obj, armature)
+                waiting_objects.append((obj, flver_data.meshes[index].material_index))
+        changed = [index for index, fingerprint in fingerprints.items()
+                   if index not in objects or objects[index].get(MESH_HASH_KEY) != fingerprint]
+        if existing is not None:
+            print(f"Updating {len(changed)} of {len(fingerprints)} meshes")
+
+        # Meshes are decoded one at a time; each mesh's raw buffers are freed once
+        # its Blender mesh has been built.
+        meshes = flver_data.iter_inflate(workers=cpu_count(), memory_budget=memory_budget, mesh_indices=changed,
+                                         weld=WELD_TOLERANCE if weld else None)
+        for position, (index, flver_mesh, inflated_mesh) in enumerate(meshes):
+            yield f"Mesh {position + 1}/{len(changed)}", 0.3 + 0.7 * position / len(changed), False
+            materials_ready()
+            if inflated_mesh is None:
+                if index in objects:
+                    remove_object(objects.pop(index))
+                continue
+
+            material_name = flver_data.materials[flver_mesh.material_index].name
+            mesh_name = f"{base_name}_{material_name}"
+            if merger is not None:
+                bone_names = [flver_data.bones[bone_index].name if 0 <= bone_index < len(flver_data.bones) else None
+                              for bone_index in flver_mesh.bone_indices]
+                waiting_merges.append((inflated_mesh, f"{file_name}:{index}", material_name,
+                                       flver_mesh.material_index, armature if import_rig else None, bone_names))
+                materials_ready()
+                continue
+
+            obj = objects.get(index)
+            if obj is None:
+                # Construct mesh
+                mesh = create_mesh(mesh_name, inflated_mesh)
+
+                # Create object and append it to the current collection
+                obj = bpy.data.objects.new(mesh_name, mesh)
+                collection.objects.link(obj)
+            else:
+                fill_mesh(obj.data, inflated_mesh)
+                obj.vertex_groups.clear()
+                if PROXY_KEY in obj:
+                    del obj[PROXY_KEY]
+                    obj.display_type = "TEXTURED"
+            obj[MESH_KEY] = index
+            obj[MESH_HASH_KEY] = fingerprints[index]
+
+            # Assign armature to object
+            if import_rig:
+                attach_armature(obj, armature)
+
+                # Create vertex groups for bones
+                if len(flver_mesh.bone_indices) == 0:
+                    print(f"{mesh_name} Has empty bone indices")
+                for bone_index in flver_mesh.bone_indices:
+                    try:
+                        obj.vertex_groups.new(name=flver_data.bones[bone_index].name)
+                    except IndexError:
+                        #print(f"Bone index error at {bone_index}")
+                        pass
+                # TODO: Meshes without bone weights should fall back to the
+                # default bone of the flver mesh.
+                assign_weights(obj, inflated_mesh)
+
+            # Assign material to object
+            waiting_objects.append((obj, flver_mesh.material_index))
+            materials_ready()
+
+        if import_dummies != "NONE" and len(flver_data.dummies) > 0:
+            yield "Dummies", 1.0, False
+            create_dummies(f"{base_name}_dummies", collection, flver_data, armature if import_rig else None,
+                           gizmos = import_dummies == "GIZMOS")
+
+        while not materials_ready():
+            yield "Textures", 1.0, True
+
+        if merger is not None and mesh_merger is None:
+            yield "Merging", 1.0, False
+            merger.build()
+
+        if existing is not None:
+            # Armatures replaced by a changed skeleton
+            for old_armature in old_armatures:
+                if not (import_rig and old_armature == armature) and \
+                        not any(obj.parent == old_armature for obj in bpy.data.objects):
+                    remove_object(old_armature)
+        # Meshes left out by mesh_filter (e.g. proxies still to load) may be out of date
+        if mesh_filter is None:
+            collection[FILE_HASH_KEY] = file_hash
+
+        print(f"Vertex buffer cache: {flver_data.decode_cache.hits} hits, "
+              f"{flver_data.decode_cache.misses} misses")
+    except BaseException:
+        # Failed, or cancelled by the caller: a batch carries on without the half built file
+        if collection is not None and existing is None:
+            remove_collection(collection)
+        raise
+    finally:
+        if meshes is not None:
+            meshes.close()
+        if tmp_path.is_dir():
+            if clean_up_files:
+                print(f"Removing {tmp_path}")
+                workspace.discard(tmp_path)
+            else:
+                workspace.release(tmp_path)
+
+    time_end = time.perf_counter()
+    print(f'FLVER time taken: {time_end - time_start}')
+
+# Custom properties identifying what an import was built from, for update_existing.
+SOURCE_KEY = "fromsoft_source"  # Collection: absolute path of the imported file
+FILE_HASH_KEY = "fromsoft_file_hash"  # Collection: sha1 of the FLVER it was built from
+MESH_KEY = "fromsoft_mesh"  # Object: index of its FLVER mesh
+MESH_HASH_KEY = "fromsoft_mesh_hash"  # Object: mesh_fingerprint of that mesh
+DUMMIES_KEY = "fromsoft_dummies"  # Object: the dummy point cloud of the import (see create_dummies)
+PROXY_KEY = "fromsoft_proxy"  # Object: absolute path of the imported file, while it is a bounding box placeholder
+
+# Positions closer than this (in FLVER units) are welded together by import_mesh's weld option.
+WELD_TOLERANCE = 1e-5
+
+def find_imported_collection(source):
+    """
+    Returns the collection of an earlier import of the file at source (absolute path), or None.
+    """
+    for collection in bpy.data.collections:
+        if collection.get(SOURCE_KEY) == source:
+            return collection
+    return None
+
+def file_sha1(path):
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+def mesh_fingerprint(flver_data, flver_mesh, import_rig, weld=False):
+    """
+    Fingerprints the Blender object a FLVER mesh turns into: the mesh's data, whether it was welded, plus the
+    names of its bones (its vertex groups) when rigged.
+    """
+    key = flver_data.mesh_fingerprint(flver_mesh)
+    if weld:
+        key += "|weld"
     if import_rig:
-        armature = create_armature(base_name, collection, flver_data)
+        bone_names = [flver_data.bones[bone_index].name if 0 <= bone_index < len(flver_data.bones) else ""
+                      for bone_index in flver_mesh.bone_indices]
+        key += "|" + json.dumps(bone_names)
+    return hashlib.sha1(key.encode()).hexdigest()
 
-    materials = []
+def attach_armature(obj, armature):
+    modifier = next((modifier for modifier in obj.modifiers if modifier.type == "ARMATURE"), None)
+    if modifier is None:
+        modifier = obj.modifiers.new(type="ARMATURE", name=pgettext("Armature"))
+    if modifier.object != armature:
+        modifier.object = armature
+    if obj.parent != armature:
+        obj.parent = armature
 
-    if get_textures:
-        try:
-            texture_path = import_textures(path, base_name, unpack_path, yabber_path)
-            files = [f for f in listdir(texture_path) if isfile(join(texture_path, f))]
-            for file in files:
-                if "_a" in file:
-                    name = file[:-6]
-                    materials.append(create_material(texture_path, name))
-        except FileNotFoundError as fne:
-            print(f"Texture file not found {fne}")
-            pass
-
-    for index, (flver_mesh, inflated_mesh) in enumerate(
-            zip(flver_data.meshes, inflated_meshes)):
-        if inflated_mesh is None:
-            continue
+def set_material(obj, material):
+    if material is None:
+        return
+    if len(obj.data.materials) == 0:
+        obj.data.materials.append(material)
+    elif obj.data.materials[0] != material:
+        obj.data.materials[0] = material
 
-        # Construct mesh
-        material_name = flver_data.materials[flver_mesh.material_index].name
-        verts = [
-            Vector((v[0], v[2], v[1]))
-            for v in inflated_mesh.vertices.positions
-        ]
+def wait_for(future, stage, fraction):
+    """
+    Yields (stage, fraction, True) from an import_mesh_steps generator until future is done.
 
-        mesh_name = f"{base_name}_{material_name}"
-        mesh = bpy.data.meshes.new(name=mesh_name)
-        mesh.from_pydata(verts, [], inflated_mesh.faces)
+    Returns:
+        The future's result.
+    """
+    while not future.done():
+        yield stage, fraction, True
+    return future.result()
+
+def remove_collection(collection):
+    """
+    Deletes a collection along with the objects only it holds and their orphaned meshes and armatures.
+    """
+    for obj in list(collection.objects):
+        if len(obj.users_collection) == 1:
+            remove_object(obj)
+    bpy.data.collections.remove(collection)
+
+def remove_object(obj):
+    """
+    Deletes an object, and its mesh or armature if nothing else uses it.
+    """
+    data = obj.data
+    bpy.data.objects.remove(obj)
+    if data is not None and data.users == 0:
+        if isinstance(data, bpy.types.Mesh):
+            bpy.data.meshes.remove(data)
+        elif isinstance(data, bpy.types.Armature):
+            bpy.data.armatures.remove(data)
 
-        # Create object and append it to the current collection
+class MeshMerger:
+    """
+    Collects inflated meshes and builds one object per material (and
+    armature), so large maps do not turn into tens of thousands of objects.
+    Each face keeps the index of the mesh it came from in the integer face
+    attribute "source_mesh", indexing the object's "fromsoft_sources" list of
+    "file name:mesh index" strings.
+
+    Args:
+        collection (Collection): Collection the merged objects are linked to.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.groups = {}
+
+    def add(self, inflated_mesh, source, name, material, armature=None, bone_names=()):
+        """
+        Queues a mesh for merging.
+
+        Args:
+            inflated_mesh (InflatedMesh): Decoded mesh.
+            source (str): Identifies the mesh, e.g. "c1234.chrbnd.dcx:3".
+            name (str): Object name used when the mesh has no material.
+            material (Material): Blender material, or None.
+            armature (Object): Armature the mesh is skinned to, or None.
+            bone_names (list): Bone names indexed by the mesh's bone indices.
+        """
+        key = (material.name if material is not None else name, armature.name if armature is not None else None)
+        group = self.groups.setdefault(key, {
+            "name": key[0], "material": material, "armature": armature, "meshes": [], "sources": [], "bones": {}})
+        if armature is not None and len(inflated_mesh.vertices.bone_indices) > 0:
+            # Bone indices are local to each mesh, so map them onto the group's bone list
+            lookup = np.full(max(len(bone_names), int(inflated_mesh.vertices.bone_indices.max()) + 1), 2**30, np.int32)
+            for local_index, bone_name in enumerate(bone_names):
+                if bone_name is not None:
+                    lookup[local_index] = group["bones"].setdefault(bone_name, len(group["bones"]))
+            remapped = copy.copy(inflated_mesh)
+            remapped.vertices = copy.copy(inflated_mesh.vertices)
+            remapped.vertices.bone_indices = lookup[inflated_mesh.vertices.bone_indices]
+            inflated_mesh = remapped
+        group["meshes"].append(inflated_mesh)
+        group["sources"].append(source)
+
+    def build(self):
+        """
+        Creates the merged objects and clears the queue.
+
+        Returns:
+            list: The new objects.
+        """
+        objects = []
+        for group in self.groups.values():
+            merged, sources = concatenate_meshes(group["meshes"])
+            group["meshes"].clear()
+            mesh = create_mesh(group["name"], merged)
+            if hasattr(mesh, "attributes"):
+                attribute = mesh.attributes.new(name="source_mesh", type="INT", domain="FACE")
+                attribute.data.foreach_set("value", sources)
+
+            obj = bpy.data.objects.new(group["name"], mesh)
+            obj["fromsoft_sources"] = json.dumps(group["sources"])
+            self.collection.objects.link(obj)
+            if group["armature"] is not None:
+                obj.modifiers.new(type="ARMATURE", name=pgettext("Armature")).object = group["armature"]
+                obj.parent = group["armature"]
+                for bone_name in group["bones"]:
+                    obj.vertex_groups.new(name=bone_name)
+                assign_weights(obj, merged)
+            if group["material"] is not None:
+                obj.data.materials.append(group["material"])
+            objects.append(obj)
+        print(f"Merged {sum(len(group['sources']) for group in self.groups.values())} meshes into {len(objects)} objects")
+        self.groups.clear()
+        return objects
+
+def create_mesh(name, inflated_mesh):
+    """
+    Creates a Blender mesh from decoded FLVER vertex data, writing all
+    attributes in bulk with foreach_set.
+
+    Args:
+        name (str): Name of the mesh datablock.
+        inflated_mesh (InflatedMesh): Decoded faces and vertex attributes.
+
+    Returns:
+        Mesh: The new Blender mesh.
+    """
+    mesh = bpy.data.meshes.new(name=name)
+    fill_mesh(mesh, inflated_mesh)
+    return mesh
+
+def fill_mesh(mesh, inflated_mesh):
+    """
+    Writes decoded FLVER vertex data into a Blender mesh. A mesh that already
+    has the same vertices and faces keeps its topology and only has its
+    attributes overwritten; any other existing geometry is replaced. Welded
+    meshes (see flver.weld_vertices) get their UVs, colors and normals per loop.
+
+    Args:
+        mesh (Mesh): New or previously imported Blender mesh.
+        inflated_mesh (InflatedMesh): Decoded faces and vertex attributes.
+    """
+    vertices = inflated_mesh.vertices
+    faces = inflated_mesh.faces
+    loop_vertices = np.ascontiguousarray(faces.ravel(), dtype=np.int32)
+
+    if not has_topology(mesh, len(vertices.positions), loop_vertices):
+        if len(mesh.vertices) > 0:
+            mesh.clear_geometry()
+        mesh.vertices.add(len(vertices.positions))
+        mesh.loops.add(len(loop_vertices))
+        mesh.loops.foreach_set("vertex_index", loop_vertices)
+        mesh.polygons.add(len(faces))
+        mesh.polygons.foreach_set("loop_start", np.arange(0, len(loop_vertices), 3, dtype=np.int32))
+        if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+            mesh.polygons.foreach_set("loop_total", np.full(len(faces), 3, dtype=np.int32))
+        mesh.polygons.foreach_set("use_smooth", np.ones(len(faces), dtype=bool))
+    mesh.vertices.foreach_set("co", swap_yz(vertices.positions).ravel())
+
+    # Per-loop attributes are gathered from the per-vertex arrays unless the mesh is welded
+    loops = inflated_mesh.loop_attributes(("colors",))
+    for layer_index, loop_uv in enumerate(loops.uvs):
+        layer_name = "UVMap" if layer_index == 0 else f"UVMap{layer_index + 1}"
+        uv_layer = mesh.uv_layers.get(layer_name) or mesh.uv_layers.new(name=layer_name)
+        loop_uv = loop_uv * np.float32((1.0, -1.0)) + np.float32((0.0, 1.0))
+        uv_layer.data.foreach_set("uv", loop_uv.ravel())
+    for uv_layer in list(mesh.uv_layers)[len(loops.uvs):]:
+        mesh.uv_layers.remove(uv_layer)
+
+    color_layer = mesh.vertex_colors.get("Col")
+    if len(loops.colors) > 0:
+        if color_layer is None:
+            color_layer = mesh.vertex_colors.new(name="Col")
+        color_layer.data.foreach_set("color", np.ascontiguousarray(loops.colors).ravel())
+    elif color_layer is not None:
+        mesh.vertex_colors.remove(color_layer)
+
+    mesh.update()
+
+    welded = inflated_mesh.loops is not None
+    if len(loops.normals if welded else vertices.normals) > 0:
+        if hasattr(mesh, "use_auto_smooth"): # Required for custom normals before Blender 4.1
+            mesh.use_auto_smooth = True
+        if welded:
+            mesh.normals_split_custom_set(swap_yz(loops.normals))
+        else:
+            mesh.normals_split_custom_set_from_vertices(swap_yz(vertices.normals))
+
+def has_topology(mesh, vertex_count, loop_vertices):
+    # Whether the mesh already has exactly these triangles over vertex_count vertices.
+    if len(mesh.vertices) != vertex_count or len(mesh.loops) != len(loop_vertices) \
+            or len(mesh.polygons) * 3 != len(loop_vertices):
+        return False
+    existing = np.empty(len(loop_vertices), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", existing)
+    return np.array_equal(existing, loop_vertices)
+
+# Quads over the corners of a box, corner i taking the max along x, y and z for bits 4, 2 and 1 of i.
+BOX_FACES = ((0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3))
+
+def create_proxies(name, collection, flver_data, source):
+    """
+    Creates a placeholder object for each selected FLVER mesh from its
+    bounding box alone (the file's, for meshes without one), so large maps
+    can be laid out before any vertex data is read. Each placeholder is a box
+    displayed as bounds, with the mesh index under MESH_KEY and the source
+    file under PROXY_KEY. Importing the file again with update_existing (see
+    DCXBLENDER_OT_load_proxies) fills the geometry into the same objects.
+
+    Args:
+        name (str): Base name of the objects.
+        collection (Collection): Collection of the import, with SOURCE_KEY set.
+        flver_data (Flver): The FLVER's header and tables, buffers need not be read.
+        source (str): Absolute path of the imported file.
+    """
+    header = flver_data.header
+    corner_bits = (np.arange(8)[:, None] >> np.array([2, 1, 0])) & 1
+    for index in flver_data.selected_mesh_indices:
+        flver_mesh = flver_data.meshes[index]
+        box_min, box_max = flver_mesh.bounding_box_min, flver_mesh.bounding_box_max
+        if box_min is None or box_max is None:
+            box_min, box_max = header.bounding_box_min, header.bounding_box_max
+        corners = np.where(corner_bits, np.asarray(box_max, np.float32), np.asarray(box_min, np.float32))
+
+        material_name = flver_data.materials[flver_mesh.material_index].name
+        mesh_name = f"{name}_{material_name}"
+        mesh = bpy.data.meshes.new(name=mesh_name)
+        mesh.from_pydata(swap_yz(corners).tolist(), [], BOX_FACES)
         obj = bpy.data.objects.new(mesh_name, mesh)
+        obj.display_type = "BOUNDS"
+        obj[MESH_KEY] = index
+        obj[MESH_HASH_KEY] = ""  # Never matches, so the next update builds the real mesh
+        obj[PROXY_KEY] = source
         collection.objects.link(obj)
 
-        # Assign armature to object
-        if import_rig:
-            obj.modifiers.new(type="ARMATURE", name=pgettext("Armature")).object = armature
-            obj.parent = armature
-            
-            # Create vertex groups for bones
-            if len(flver_mesh.bone_indices) == 0:
-                print(f"{mesh_name} Has empty bone indices")
-            for bone_index in flver_mesh.bone_indices:
-                try:
-                    obj.vertex_groups.new(name=flver_data.bones[bone_index].name)
-                except IndexError:
-                    #print(f"Bone index error at {bone_index}")
-                    pass
+def create_dummies(name, collection, flver_data, armature=None, gizmos=False):
+    """
+    Creates a single point cloud object holding all of a FLVER's dummy
+    polygons (the attachment points for effects, hitboxes and so on), rather
+    than an Empty per dummy. Each point has the integer attributes
+    "reference_id", "parent_bone" and "attach_bone", the vector attributes
+    "forward" and "upward" and the color attribute "color". With an armature,
+    each point is weighted to its attach bone so it follows the rig.
 
-        # Assign materials to object
-        # TODO: Replace with a more robust method.
-        if get_textures:
-            for material in materials:
-                if (material.name.lower() == mesh_name.lower()) or \
-                    (material.name.lower().endswith(mesh_name.lower())) or \
-                    (mesh_name.lower().endswith(material.name.lower())):
-                    obj.data.materials.append(material)
-
-        bm = bmesh.new()
-        bm.from_mesh(mesh)
-
-        # Creating UVs
-        uv_layer = bm.loops.layers.uv.new()
-        for face in bm.faces:
-            for loop in face.loops:
-                u_0, v_0 = inflated_mesh.vertices.uv[loop.vert.index][:2]
-                loop[uv_layer].uv = (u_0, 1.0 - v_0)
-            face.smooth = True
+    Args:
+        name (str): Name of the object and its mesh.
+        collection (Collection): Collection to link the object to.
+        flver_data (Flver): Source of the dummies.
+        armature (Object): The FLVER's armature, or None.
+        gizmos (bool): Draw each point as a cone along its forward vector with a Geometry Nodes modifier
+            (Blender 3.2+).
 
-        if import_rig:
-            weight_layer = bm.verts.layers.deform.new()
-            for vert in bm.verts:
-                try:
-                    weights = inflated_mesh.vertices.bone_weights[vert.index]
-                    indices = inflated_mesh.vertices.bone_indices[vert.index]
-                    for index, weight in zip(indices, weights):
-                        if weight == 0.0:
-                            continue
-                        vert[weight_layer][index] = weight
-                except IndexError:
-                    # TODO: Replace with check for zero bone_count, which then uses
-                    # the data from the flver file to get bone weights and indices,
-                    # not each flver mesh.
-                    continue 
-
-        bm.to_mesh(mesh)
-        bm.free()
-        mesh.update()
-
-    if clean_up_files:
-        print(f"Removing {tmp_path}")
-        rmtree(tmp_path)
+    Returns:
+        Object: The point cloud object.
+    """
+    dummies = flver_data.dummies
+    positions = np.array(dummies.positions, dtype=np.float32)
+    forwards = np.array(dummies.forwards, dtype=np.float32)
+    upwards = np.array(dummies.upwards, dtype=np.float32)
+
+    # Dummies are placed relative to their parent bone
+    matrices = bone_matrices(flver_data)
+    for bone_index in np.unique(dummies.parent_bone_indices):
+        matrix = matrices.get(int(bone_index))
+        if matrix is None:
+            continue
+        rotation = np.array(matrix.to_3x3(), dtype=np.float32)
+        selected = dummies.parent_bone_indices == bone_index
+        positions[selected] = positions[selected] @ rotation.T + np.array(matrix.translation, dtype=np.float32)
+        forwards[selected] = forwards[selected] @ rotation.T
+        upwards[selected] = upwards[selected] @ rotation.T
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(positions))
+    mesh.vertices.foreach_set("co", swap_yz(positions).ravel())
+    if hasattr(mesh, "attributes"):
+        for attribute_name, attribute_type, values in (
+                ("reference_id", "INT", dummies.reference_ids.astype(np.int32)),
+                ("parent_bone", "INT", dummies.parent_bone_indices.astype(np.int32)),
+                ("attach_bone", "INT", dummies.attach_bone_indices.astype(np.int32)),
+                ("forward", "FLOAT_VECTOR", swap_yz(forwards)),
+                ("upward", "FLOAT_VECTOR", swap_yz(upwards)),
+                ("color", "FLOAT_COLOR", dummies.colors.astype(np.float32) / 255)):
+            attribute = mesh.attributes.new(name=attribute_name, type=attribute_type, domain="POINT")
+            field = "value" if attribute_type == "INT" else ("color" if attribute_type == "FLOAT_COLOR" else "vector")
+            attribute.data.foreach_set(field, np.ascontiguousarray(values).ravel())
+    mesh.update()
+
+    obj = bpy.data.objects.new(name, mesh)
+    obj[DUMMIES_KEY] = True
+    collection.objects.link(obj)
+    if armature is not None:
+        attach_armature(obj, armature)
+        attach_indices = dummies.attach_bone_indices
+        for bone_index in np.unique(attach_indices):
+            if 0 <= bone_index < len(flver_data.bones):
+                group = obj.vertex_groups.new(name=flver_data.bones[int(bone_index)].name)
+                group.add(np.flatnonzero(attach_indices == bone_index).tolist(), 1.0, "REPLACE")
+    if gizmos:
+        group = dummy_gizmo_nodes()
+        if group is not None:
+            obj.modifiers.new(name="Dummy gizmos", type="NODES").node_group = group
+    return obj
+
+def dummy_gizmo_nodes():
+    """
+    Returns the Geometry Nodes group drawing dummy points as cones along their
+    "forward" attribute, creating it on first use, or None before Blender 3.2.
+    """
+    name = "FromSoft dummy gizmos"
+    group = bpy.data.node_groups.get(name)
+    if group is not None:
+        return group
+    if not hasattr(bpy.types, "GeometryNodeInputNamedAttribute"):
+        print("Dummy gizmos need Blender 3.2 or later")
+        return None
+
+    group = bpy.data.node_groups.new(name, "GeometryNodeTree")
+    if hasattr(group, "interface"): # Blender 4.0+
+        group.interface.new_socket("Geometry", in_out="INPUT", socket_type="NodeSocketGeometry")
+        group.interface.new_socket("Geometry", in_out="OUTPUT", socket_type="NodeSocketGeometry")
+    else:
+        group.inputs.new("NodeSocketGeometry", "Geometry")
+        group.outputs.new("NodeSocketGeometry", "Geometry")
+
+    nodes = group.nodes
+    links = group.links
+    inputs = nodes.new("NodeGroupInput")
+    cone = nodes.new("GeometryNodeMeshCone")
+    cone.inputs["Radius Bottom"].default_value = 0.02
+    cone.inputs["Depth"].default_value = 0.08
+    forward = nodes.new("GeometryNodeInputNamedAttribute")
+    forward.data_type = "FLOAT_VECTOR"
+    forward.inputs["Name"].default_value = "forward"
+    # Align Euler to Vector was replaced in Blender 4.2
+    if hasattr(bpy.types, "FunctionNodeAlignRotationToVector"):
+        align = nodes.new("FunctionNodeAlignRotationToVector")
+    else:
+        align = nodes.new("FunctionNodeAlignEulerToVector")
+    align.axis = "Z"
+    instances = nodes.new("GeometryNodeInstanceOnPoints")
+    join = nodes.new("GeometryNodeJoinGeometry")
+
+    links.new(next(output for output in forward.outputs if output.enabled), align.inputs["Vector"])
+    links.new(inputs.outputs["Geometry"], instances.inputs["Points"])
+    links.new(cone.outputs["Mesh"], instances.inputs["Instance"])
+    links.new(align.outputs[0], instances.inputs["Rotation"])
+    links.new(inputs.outputs["Geometry"], join.inputs["Geometry"])
+    links.new(instances.outputs["Instances"], join.inputs["Geometry"])
+    links.new(join.outputs["Geometry"], nodes.new("NodeGroupOutput").inputs["Geometry"])
+    return group
+
+def swap_yz(vectors):
+    """
+    Converts FLVER (Y-up) vectors to Blender (Z-up) ones.
+
+    Args:
+        vectors (ndarray): (N, 3) array of positions or directions.
+
+    Returns:
+        ndarray: Contiguous float32 (N, 3) array.
+    """
+    return np.ascontiguousarray(vectors[:, (0, 2, 1)], dtype=np.float32)
+
+def assign_weights(obj, inflated_mesh):
+    """
+    Writes bone weights into the object's vertex groups, batching vertices
+    that share a group and weight into a single VertexGroup.add call.
+
+    Args:
+        obj (Object): Mesh object whose vertex groups index the mesh's bones.
+        inflated_mesh (InflatedMesh): Decoded bone weights and indices.
+    """
+    weights = inflated_mesh.vertices.bone_weights
+    indices = inflated_mesh.vertices.bone_indices
+    if len(weights) == 0 or len(indices) == 0:
+        return
+
+    vertex_ids = np.repeat(np.arange(len(weights)), weights.shape[1])
+    group_ids = indices.ravel()
+    weights = weights.ravel()
+    used = (weights != 0.0) & (group_ids < len(obj.vertex_groups))
+    vertex_ids, group_ids, weights = vertex_ids[used], group_ids[used], weights[used]
+
+    order = np.lexsort((weights, group_ids))
+    vertex_ids, group_ids, weights = vertex_ids[order], group_ids[order], weights[order]
+    splits = np.flatnonzero((np.diff(group_ids) != 0) | (np.diff(weights) != 0)) + 1
+    for start, end in zip(np.r_[0, splits], np.r_[splits, len(weights)]):
+        if start == end:
+            continue
+        obj.vertex_groups[int(group_ids[start])].add(
+            vertex_ids[start:end].tolist(), float(weights[start]), "REPLACE")
+
+# Custom property on armature data holding each bone's fingerprint, see bone_fingerprints.
+SKELETON_KEY = "fromsoft_bones"
 
-    time_end = time.perf_counter()
-    print(f'FLVER time taken: {time_end - time_start}')
-        
 def create_armature(name, collection, flver_data):
     """
     Creates a Blender armature.
@@ -180,6 +812,7 @@ def create_armature(name, collection, flver_data):
     collection.objects.link(armature)
     armature.data.display_type = "OCTAHEDRAL"
     armature.show_in_front = True
+    armature.data[SKELETON_KEY] = json.dumps(bone_fingerprints(flver_data))
     bpy.context.view_layer.objects.active = armature
     bpy.ops.object.editmode_toggle() 
 
@@ -188,35 +821,14 @@ def create_armature(name, collection, flver_data):
         bone = armature.data.edit_bones.new(f_bone.name)
         if f_bone.parent_index < 0:
             root_bones.append(bone)
-    
-    def transform_bone_and_siblings(bone_index, parent_matrix):
-        while bone_index != -1:
-            flver_bone = flver_data.bones[bone_index]
-            bone = armature.data.edit_bones[bone_index]
-            if flver_bone.parent_index >= 0:
-                bone.parent = armature.data.edit_bones[flver_bone.parent_index]
-
-            translation_vector = Vector(
-                (flver_bone.translation[0], flver_bone.translation[1],
-                 flver_bone.translation[2]))
-            rotation_matrix = (
-                Matrix.Rotation(flver_bone.rotation[1], 4, 'Y')
-                @ Matrix.Rotation(flver_bone.rotation[2], 4, 'Z')
-                @ Matrix.Rotation(flver_bone.rotation[0], 4, 'X'))
-
-            head = parent_matrix @ translation_vector
-            tail = head + rotation_matrix @ Vector((0, 0.05, 0))
-
-            bone.head = (head[0], head[2], head[1])
-            bone.tail = (tail[0], tail[2], tail[1])
-
-            # Transform children and advance to next sibling
-            transform_bone_and_siblings(
-                flver_bone.child_index, parent_matrix
-                @ Matrix.Translation(translation_vector) @ rotation_matrix)
-            bone_index = flver_bone.next_sibling_index
 
-    transform_bone_and_siblings(0, Matrix())
+    for bone_index, (head, tail) in bone_positions(flver_data).items():
+        flver_bone = flver_data.bones[bone_index]
+        bone = armature.data.edit_bones[bone_index]
+        if flver_bone.parent_index >= 0:
+            bone.parent = armature.data.edit_bones[flver_bone.parent_index]
+        bone.head = head
+        bone.tail = tail
 
     def connect_bone(bone):
         children = bone.children
@@ -243,104 +855,481 @@ def create_armature(name, collection, flver_data):
     bpy.ops.object.editmode_toggle() 
     return armature
 
-def import_textures(path, base_name, unpack_path, yabber_path):
+def bone_matrices(flver_data):
+    """
+    Computes the rest transforms of the bones reachable from the first bone, in FLVER (Y-up) model space.
+
+    Returns:
+        dict: 4x4 Matrix by bone index.
+    """
+    matrices = {}
+    def transform_bone_and_siblings(bone_index, parent_matrix):
+        while bone_index != -1:
+            flver_bone = flver_data.bones[bone_index]
+            rotation_matrix = (
+                Matrix.Rotation(flver_bone.rotation[1], 4, 'Y')
+                @ Matrix.Rotation(flver_bone.rotation[2], 4, 'Z')
+                @ Matrix.Rotation(flver_bone.rotation[0], 4, 'X'))
+            matrices[bone_index] = parent_matrix @ Matrix.Translation(Vector(flver_bone.translation)) @ rotation_matrix
+            transform_bone_and_siblings(flver_bone.child_index, matrices[bone_index])
+            bone_index = flver_bone.next_sibling_index
+
+    if len(flver_data.bones) > 0:
+        transform_bone_and_siblings(0, Matrix())
+    return matrices
+
+def bone_positions(flver_data):
+    """
+    Computes the rest positions of the bones reachable from the first bone.
+
+    Args:
+        flver_data (Flver): Data for bone information.
+
+    Returns:
+        dict: (head, tail) tuples in Blender coordinates by bone index.
+    """
+    positions = {}
+    def transform_bone_and_siblings(bone_index, parent_matrix):
+        while bone_index != -1:
+            flver_bone = flver_data.bones[bone_index]
+
+            translation_vector = Vector(
+                (flver_bone.translation[0], flver_bone.translation[1],
+                 flver_bone.translation[2]))
+            rotation_matrix = (
+                Matrix.Rotation(flver_bone.rotation[1], 4, 'Y')
+                @ Matrix.Rotation(flver_bone.rotation[2], 4, 'Z')
+                @ Matrix.Rotation(flver_bone.rotation[0], 4, 'X'))
+
+            head = parent_matrix @ translation_vector
+            tail = head + rotation_matrix @ Vector((0, 0.05, 0))
+            positions[bone_index] = ((head[0], head[2], head[1]), (tail[0], tail[2], tail[1]))
+
+            # Transform children and advance to next sibling
+            transform_bone_and_siblings(
+                flver_bone.child_index, parent_matrix
+                @ Matrix.Translation(translation_vector) @ rotation_matrix)
+            bone_index = flver_bone.next_sibling_index
+
+    if len(flver_data.bones) > 0:
+        transform_bone_and_siblings(0, Matrix())
+    return positions
+
+def bone_fingerprints(flver_data):
+    """
+    Fingerprints each bone by its name, parent's name and local transform, so
+    that skeletons can be compared bone by bone across FLVER files.
+
+    Returns:
+        dict: Fingerprint strings by bone name.
+    """
+    bones = flver_data.bones
+    transforms = np.round(np.hstack((bones.translations, bones.rotations, bones.scales)).astype(np.float64), 4)
+    names = list(bones.names)
+    fingerprints = {}
+    for index, name in enumerate(names):
+        parent_index = int(bones.parent_indices[index])
+        parent = names[parent_index] if 0 <= parent_index < len(names) else ""
+        key = f"{parent}|{transforms[index].tolist()}"
+        fingerprints[name] = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return fingerprints
+
+def find_armature(flver_data, candidates):
+    """
+    Finds an armature among candidates with the same skeleton as the FLVER,
+    so that e.g. the parts of an armor set share one armature. An armature is
+    only reused if it has the FLVER's root bones and every bone of the smaller
+    of the two skeletons matches in the other; the FLVER's missing bones are
+    added to it.
+
+    Args:
+        flver_data (Flver): Data for bone information.
+        candidates (list): Armature objects that may be reused, e.g. those created earlier in the same batch.
+
+    Returns:
+        Object: The matching armature, or None.
+    """
+    fingerprints = bone_fingerprints(flver_data)
+    if len(fingerprints) == 0:
+        return None
+    roots = [name for name, parent_index in zip(flver_data.bones.names, flver_data.bones.parent_indices)
+             if parent_index < 0]
+    best, best_missing = None, None
+    for obj in candidates:
+        try:
+            if obj.type != "ARMATURE" or SKELETON_KEY not in obj.data:
+                continue
+        except ReferenceError:
+            continue  # Removed since, e.g. replaced by an update
+        existing = json.loads(obj.data[SKELETON_KEY])
+        if any(existing.get(name) != fingerprints[name] for name in roots):
+            continue
+        smaller, larger = (existing, fingerprints) if len(existing) <= len(fingerprints) else (fingerprints, existing)
+        if any(larger.get(name) != fingerprint for name, fingerprint in smaller.items()):
+            continue
+        missing = [name for name in fingerprints if name not in existing]
+        if best is None or len(missing) < len(best_missing):
+            best, best_missing = obj, missing
+    if best is None:
+        return None
+    if best_missing:
+        add_bones(best, flver_data, best_missing)
+        existing = json.loads(best.data[SKELETON_KEY])
+        existing.update((name, fingerprints[name]) for name in best_missing)
+        best.data[SKELETON_KEY] = json.dumps(existing)
+    print(f"Reusing armature {best.name}" + (f" with {len(best_missing)} added bones" if best_missing else ""))
+    return best
+
+def add_bones(armature, flver_data, names):
+    """
+    Adds the named FLVER bones to an existing armature, parented by name.
+    """
+    names = set(names)
+    indices = [index for index, bone in enumerate(flver_data.bones) if bone.name in names]
+    positions = bone_positions(flver_data)
+    bpy.context.view_layer.objects.active = armature
+    bpy.ops.object.mode_set(mode = "EDIT")
+    edit_bones = armature.data.edit_bones
+    for index in indices:
+        bone = edit_bones.new(flver_data.bones[index].name)
+        bone.head, bone.tail = positions.get(index, ((0, 0, 0), (0, 0.05, 0)))
+    for index in indices:
+        parent_index = flver_data.bones[index].parent_index
+        if parent_index >= 0:
+            edit_bones[flver_data.bones[index].name].parent = edit_bones.get(flver_data.bones[parent_index].name)
+    bpy.ops.object.mode_set(mode = "OBJECT")
+
+def import_textures(path, base_name, workspace, yabber_path, scheduler, mip_level=0):
     """
     Unpacks the specified tpf file into png textures
     and returns the directory where unpacked.
-    Unpacks if in dcx compression.
+    Unpacks if in dcx compression. Textures converted by an earlier import of
+    the same, unchanged file are reused.
     
     Args:
         path (str): Path to the directory where the texture file exists.
         base_name (str): 'ID' of the file being unpacked, consistent with model file.
-        unpack_path (str): User defined unpack directory.
+        workspace (Workspace): Manages the unpack directory.
+        yabber_path (str): Directory containing Yabber.exe.
+        scheduler (ToolScheduler): Runs Yabber and texconv.
+        mip_level (int): Mip level to convert for preview textures, 0 for full resolution.
 
     Returns:
         str: The directory where the textures have been unpacked to.
 
     Raises:
         FileNotFoundError: If the texture file does not exist.
-
-    TODO:
-        Instead of looking for a same-name texture file, use allmaterialbnd.mtdbnd.dcx to lookup directory.
     """
     
     if isfile(path / f"{base_name}.tpf"): # Dumb temp fix for partsbnd case
-        tpf_path = path / f"{base_name}.tpf"
+        source = path / f"{base_name}.tpf"
     else:
-        copyfile(path / f"{base_name}.texbnd.dcx", unpack_path / base_name / (f"{base_name}.texbnd.dcx"))
-        command = f'"{yabber_path}\\Yabber.exe" "{unpack_path}\\{base_name}\\{base_name}.texbnd.dcx"'
-        subprocess.run(command, shell = False)
-        tpf_path = unpack_path / base_name / (f"{base_name}-texbnd-dcx") / "chr" / base_name / Path(f"{base_name}.tpf")
-
-    TPFFile = TPF(tpf_path)
-    print(f'Importing TPF file from {str(tpf_path)}...', end = '')
-    TPFFile.unpack()
-    TPFFile.save_textures_to_file(file_path = unpack_path / base_name)
-    convert_to_png(unpack_path / f"{base_name}_textures\\")
-    print('done')
-    return unpack_path / f"{base_name}_textures\\"
+        source = path / f"{base_name}.texbnd.dcx"
+        if not isfile(source):
+            raise FileNotFoundError(source)
+
+    def extract(input_path, entry_dir):
+        if input_path.name.endswith(".texbnd.dcx"):
+            scheduler.run([Path(yabber_path) / "Yabber.exe", input_path], check = False)
+            tpf_path = entry_dir / (f"{base_name}-texbnd-dcx") / "chr" / base_name / Path(f"{base_name}.tpf")
+        else:
+            tpf_path = input_path # Loose tpf files are read in place
+        TPFFile = TPF(tpf_path)
+        print(f'Importing TPF file from {str(tpf_path)}...', end = '')
+        TPFFile.unpack()
+        TPFFile.save_textures_to_file(file_path = entry_dir / base_name)
+        convert_to_png(entry_dir / f"{base_name}_textures", scheduler, mip_level = mip_level)
+        print('done')
+
+    # Blender images keep pointing at the png files, so texture entries are not evicted while in use.
+    # Conversions of older versions of the file at this mip level are replaced.
+    entry_dir = workspace.extract(source, extract, stage = source.name.endswith(".texbnd.dcx"), evictable = False,
+                                  tag = f"mip{mip_level}:png{PNG_VERSION}", supersedes = f"mip{mip_level}:")
+    workspace.release(entry_dir)
+    return texture_png_dir(entry_dir / f"{base_name}_textures", mip_level)
+
+def import_indexed_textures(source, base_name, flver_data, asset_index, workspace, scheduler, mip_level=0):
+    """
+    Converts the textures referenced by the flver's materials into png files,
+    finding them through the asset index wherever they live in the game.
+
+    Args:
+        source (Path): The file being imported; the textures are stored in a workspace entry of it.
+        base_name (str): 'ID' of the file being imported.
+        flver_data (Flver): The model, whose texture paths name the textures to look up.
+        asset_index (AssetIndex): Index of the game's textures.
+        workspace (Workspace): Manages the unpack directory.
+        scheduler (ToolScheduler): Runs texconv.
+        mip_level (int): Mip level to convert for preview textures, 0 for full resolution.
+
+    Returns:
+        Path: The directory containing the png files, or None if the index has none of the textures.
+    """
+    names = sorted({PureWindowsPath(texture.path).stem for texture in flver_data.textures if texture.path})
+    entries = [entry for entry in map(asset_index.find_texture, names) if entry is not None]
+    if len(entries) == 0:
+        return None
+    print(f"Found {len(entries)} of {len(names)} textures in the asset index")
+    normal_maps = {PureWindowsPath(texture.path).stem for texture in flver_data.textures
+                   if texture.path and texture_slot_role(texture.type_name, texture.path) == "normal"}
+
+    def extract(input_path, entry_dir):
+        texture_dir = entry_dir / f"{base_name}_textures"
+        texture_dir.mkdir()
+        for entry, data in zip(entries, asset_index.read(entries)):
+            with open(texture_dir / f"{entry.name}.dds", "wb") as file:
+                file.write(data)
+        convert_to_png(texture_dir, scheduler, normal_maps, mip_level)
+
+    # Keyed on the texture contents too, so changed game files are converted again.
+    tag = f"mip{mip_level}:png{PNG_VERSION}:" + hashlib.sha1("|".join(entry.hash for entry in entries).encode()).hexdigest()
+    entry_dir = workspace.extract(source, extract, stage = False, evictable = False, tag = tag,
+                                  supersedes = f"mip{mip_level}:")
+    workspace.release(entry_dir)
+    return texture_png_dir(entry_dir / f"{base_name}_textures", mip_level)
+
+def referenced_entries(root):
+    """
+    Returns the names of the unpack directory entries (see Workspace) that Blender images load files from.
+    """
+    root = Path(root).resolve()
+    names = set()
+    for image in bpy.data.images:
+        if not image.filepath:
+            continue
+        try:
+            relative = Path(bpy.path.abspath(image.filepath)).resolve().relative_to(root)
+        except ValueError:
+            continue
+        if len(relative.parts) > 1:
+            names.add(relative.parts[0])
+    return names
+
+def texture_png_dir(texture_dir, mip_level):
+    # convert_to_png writes previews to a subdirectory, keeping the dds files for load_full_textures
+    return texture_dir / f"mip{mip_level}" if mip_level > 0 else texture_dir
+
+def load_full_textures(images, scheduler=None, workspace=None):
+    """
+    Replaces preview textures with full resolution ones. The full size png
+    files are converted from the dds files kept next to the previews, and the
+    images are reloaded in place, so materials and meshes stay untouched.
+
+    Args:
+        images (list): Blender images to check; those that are not previews are skipped.
+        scheduler (ToolScheduler): Runs texconv. A private one is used if not given.
+        workspace (Workspace): The unpack directory, to account for the full size files in its budget.
+
+    Returns:
+        int: Number of images upgraded.
+    """
+    previews = {}
+    for image in images:
+        image_path = Path(bpy.path.abspath(image.filepath))
+        if re.fullmatch(r"mip\d+", image_path.parent.name):
+            previews.setdefault(image_path.parent, []).append(image)
+
+    upgraded = 0
+    for preview_dir, preview_images in previews.items():
+        texture_dir = preview_dir.parent
+        normal_maps = {f.stem[:-len("_spec")] for f in preview_dir.glob("*_spec.png")}
+        convert_to_png(texture_dir, scheduler, normal_maps)
+        if workspace is not None:
+            workspace.refresh_size(texture_dir)
+        for image in preview_images:
+            full_path = texture_dir / Path(bpy.path.abspath(image.filepath)).name
+            if full_path.is_file():
+                image.filepath = str(full_path)
+                image.reload()
+                upgraded += 1
+    return upgraded
     
 
-def create_material(texture_path, base_name):
+def create_flver_materials(base_name, flver_data, texture_path, material_library=None):
     """
-    Creates a blender principled shader material
-    with an albedo, roughness and normal map.
+    Creates a Blender material for each FLVER material that has textures,
+    picking the role of each texture from its slot type (e.g. g_Diffuse).
+    Slots the FLVER leaves empty fall back to the MTD's default texture.
 
     Args:
-        texture_path (str): absolute path to texture unpack directory
-        base_name (str): 'ID' of the file being unpacked, consistent with model file.
+        base_name (str): 'ID' of the file being imported, used to prefix material names.
+        flver_data (Flver): The model.
+        texture_path (Path): Directory containing the converted png textures.
+        material_library (MaterialLibrary): The game's parsed MTDs, if available.
 
     Returns:
-        Material: Blender principled shader material.
+        dict: Blender materials by FLVER material index.
     """
+    texture_files = {f.stem.lower(): f for f in Path(texture_path).iterdir() if f.suffix.lower() == ".png"}
+    materials = {}
+    for material_index, flver_material in enumerate(flver_data.materials):
+        mtd = material_library.get(flver_material.mtd_path) if material_library is not None else None
 
-    material = bpy.data.materials.new(base_name)
-    material.use_nodes = True
-    node_tree = material.node_tree
+        slot_paths = {}
+        first = flver_material.texture_index
+        for texture_index in range(first, first + flver_material.texture_count):
+            texture = flver_data.textures[texture_index]
+            slot_paths[texture.type_name] = texture.path
+        if mtd is not None:
+            for slot in mtd.textures:
+                if not slot_paths.get(slot.type):
+                    slot_paths[slot.type] = slot.path
+
+        textures = {}
+        for type_name, path in slot_paths.items():
+            if not path:
+                continue
+            role = texture_slot_role(type_name, path)
+            file = texture_files.get(PureWindowsPath(path).stem.lower())
+            if role is not None and file is not None:
+                textures.setdefault(role, file)
+        # Normal maps are converted with their blue channel split out (see tpf.convert_normal_map)
+        if "normal" in textures:
+            specular_level = texture_files.get(textures["normal"].stem.lower() + "_spec")
+            if specular_level is not None:
+                textures["specular_level"] = specular_level
+        if textures:
+            materials[material_index] = create_material(
+                f"{base_name}_{flver_material.name}", textures,
+                blend_method = mtd.blend_mode if mtd is not None else "HASHED")
+    return materials
+
+def texture_slot_role(type_name, path):
+    """
+    Returns the role of a FLVER or MTD texture slot, going by the texture's
+    file name suffix for slots without a type.
+    """
+    return texture_role(type_name) if type_name else suffix_role(PureWindowsPath(path).stem)
+
+# Texture roles in the order they appear on material templates.
+MATERIAL_ROLES = ("albedo", "specular", "metallic", "emissive", "normal", "specular_level")
+# Custom property identifying a material's texture set, used to share materials between meshes and imports.
+MATERIAL_KEY = "fromsoft_textures"
+_material_names = {}
+_material_count = -1
+
+def create_material(name, textures, blend_method="HASHED"):
+    """
+    Creates a blender material with an albedo, roughness and normal map,
+    or returns the existing one if a material with the same textures exists.
+    Its shading comes from a node group shared by all materials with the same
+    texture roles, so each material only holds image nodes.
+
+    Args:
+        name (str): Name of the material.
+        textures (dict): png file paths by role ("albedo", "specular", "metallic", "emissive", "normal",
+            "specular_level").
+        blend_method (str): Blender blend method, from the material's MTD.
+
+    Returns:
+        Material: Blender material.
+    """
+    global _material_count
+    roles = tuple(role for role in MATERIAL_ROLES if textures.get(role) is not None and isfile(textures[role]))
+    key = "|".join([blend_method] + [f"{role}={Path(textures[role]).resolve()}" for role in roles])
+    material = find_material(key)
+    if material is not None:
+        return material
 
-    bsdf = material.node_tree.nodes.get("Principled BSDF")
+    material = bpy.data.materials.new(name)
+    material[MATERIAL_KEY] = key
+    material.use_nodes = True
     material.diffuse_color = (random(), random(), random(), 1.0) # Viewport display colour
-    material.blend_method = 'HASHED'
+    material.blend_method = blend_method
+    nodes = material.node_tree.nodes
+    links = material.node_tree.links
 
-    albedo_node = create_tex_image(str(texture_path / (base_name + "_a.PNG")), material)
-    if albedo_node:
-        node_tree.links.new(albedo_node.outputs["Color"], bsdf.inputs["Base Color"])
-        node_tree.links.new(albedo_node.outputs["Alpha"], bsdf.inputs["Alpha"])
-    
-    specular_node = create_tex_image(str(texture_path / (base_name + "_r.PNG")), material)
-    if specular_node:
-        node_tree.links.new(specular_node.outputs["Color"], bsdf.inputs["Specular Tint"])
-
-    metalness_node = create_tex_image(str(texture_path / (base_name + "_m.PNG")), material)
-    if metalness_node:
-        metalness_node.image.colorspace_settings.name = 'Non-Color'
-        node_tree.links.new(metalness_node.outputs["Color"], bsdf.inputs["Metallic"])
-
-    emissive_node = create_tex_image(str(texture_path / (base_name + "_em.PNG")), material)
-    if emissive_node:
-        node_tree.links.new(emissive_node.outputs["Color"], bsdf.inputs["Emission"])
-
-    normal_node = create_tex_image(str(texture_path / (base_name + "_n.PNG")), material)
-    if normal_node:
-        normal_node.image.colorspace_settings.name = 'Non-Color'
-        sep_rgb = material.node_tree.nodes.new("ShaderNodeSeparateRGB")
-        node_tree.links.new(normal_node.outputs["Color"], sep_rgb.inputs["Image"])
-        com_rgb = material.node_tree.nodes.new("ShaderNodeCombineRGB")
-        node_tree.links.new(sep_rgb.outputs[0], com_rgb.inputs[0])
-        node_tree.links.new(sep_rgb.outputs[1], com_rgb.inputs[1])
-        node_tree.links.new(sep_rgb.outputs[2], bsdf.inputs["Specular"])
-        normalise_node = material.node_tree.nodes.new("ShaderNodeVectorMath")
-        normalise_node.operation = 'NORMALIZE'
-        node_tree.links.new(com_rgb.outputs["Image"], normalise_node.inputs["Vector"])
-        normal_conv = material.node_tree.nodes.new("ShaderNodeNormalMap")
-        node_tree.links.new(normalise_node.outputs["Vector"], normal_conv.inputs["Color"])
-        node_tree.links.new(normal_conv.outputs["Normal"], bsdf.inputs["Normal"])
-        normal_conv.inputs[0].default_value = 0.5
+    bsdf = nodes.get("Principled BSDF")
+    if bsdf is not None:
+        nodes.remove(bsdf)
+    template = nodes.new("ShaderNodeGroup")
+    template.node_tree = material_template(roles)
+    links.new(template.outputs["BSDF"], nodes.get("Material Output").inputs["Surface"])
+
+    for role in roles:
+        image_node = nodes.new("ShaderNodeTexImage")
+        image_node.image = bpy.data.images.load(str(textures[role]), check_existing=True)
+        if role in ("metallic", "normal", "specular_level"):
+            image_node.image.colorspace_settings.name = 'Non-Color'
+        links.new(image_node.outputs["Color"], template.inputs[role])
+        if role == "albedo":
+            links.new(image_node.outputs["Alpha"], template.inputs["albedo_alpha"])
+
+    _material_names[key] = material.name
+    _material_count = len(bpy.data.materials)
     return material
 
-def create_tex_image(path, material):
-    if isfile(path):
-        node = material.node_tree.nodes.new("ShaderNodeTexImage")
-        node.image = bpy.data.images.load(path)
-        return node
-    return None
\ No newline at end of file
+def find_material(key):
+    """
+    Returns the material created by create_material for a texture set key, or None.
+    """
+    global _material_count
+    material = bpy.data.materials.get(_material_names.get(key, ""))
+    if material is not None and material.get(MATERIAL_KEY) == key:
+        return material
+    # Materials were added, renamed or removed outside create_material (e.g. a .blend was opened)
+    if len(bpy.data.materials) != _material_count or key in _material_names:
+        _material_names.clear()
+        for material in bpy.data.materials:
+            if MATERIAL_KEY in material:
+                _material_names[material[MATERIAL_KEY]] = material.name
+        _material_count = len(bpy.data.materials)
+        material = bpy.data.materials.get(_material_names.get(key, ""))
+    return material
+
+def material_template(roles):
+    """
+    Returns the shader node group for materials with the given texture roles,
+    creating it on first use. Its inputs are the roles' image colors (plus
+    "albedo_alpha"), its output the shaded BSDF.
+
+    Args:
+        roles (tuple): Texture roles, in MATERIAL_ROLES order.
+
+    Returns:
+        ShaderNodeTree: The node group.
+    """
+    name = "FromSoft " + (" ".join(roles) or "untextured")
+    group = bpy.data.node_groups.get(name)
+    if group is not None:
+        return group
+
+    group = bpy.data.node_groups.new(name, "ShaderNodeTree")
+    def add_socket(in_out, socket_type, socket_name):
+        if hasattr(group, "interface"): # Blender 4.0+
+            group.interface.new_socket(socket_name, in_out=in_out, socket_type=socket_type)
+        elif in_out == "INPUT":
+            group.inputs.new(socket_type, socket_name)
+        else:
+            group.outputs.new(socket_type, socket_name)
+    for role in roles:
+        add_socket("INPUT", "NodeSocketColor", role)
+        if role == "albedo":
+            add_socket("INPUT", "NodeSocketFloat", "albedo_alpha")
+    add_socket("OUTPUT", "NodeSocketShader", "BSDF")
+
+    nodes = group.nodes
+    links = group.links
+    inputs = nodes.new("NodeGroupInput")
+    bsdf = nodes.new("ShaderNodeBsdfPrincipled")
+    links.new(bsdf.outputs["BSDF"], nodes.new("NodeGroupOutput").inputs["BSDF"])
+
+    if "albedo" in roles:
+        links.new(inputs.outputs["albedo"], bsdf.inputs["Base Color"])
+        links.new(inputs.outputs["albedo_alpha"], bsdf.inputs["Alpha"])
+    if "specular" in roles:
+        links.new(inputs.outputs["specular"], bsdf.inputs["Specular Tint"])
+    if "metallic" in roles:
+        links.new(inputs.outputs["metallic"], bsdf.inputs["Metallic"])
+    if "emissive" in roles:
+        links.new(inputs.outputs["emissive"], bsdf.inputs["Emission"])
+    if "normal" in roles:
+        # The png already has z reconstructed, so it goes straight into the Normal Map node
+        normal_conv = nodes.new("ShaderNodeNormalMap")
+        normal_conv.inputs["Strength"].default_value = 0.5
+        links.new(inputs.outputs["normal"], normal_conv.inputs["Color"])
+        links.new(normal_conv.outputs["Normal"], bsdf.inputs["Normal"])
+    if "specular_level" in roles:
+        specular = bsdf.inputs.get("Specular") or bsdf.inputs.get("Specular IOR Level") # Renamed in Blender 4.0
+        links.new(inputs.outputs["specular_level"], specular)
+    return group
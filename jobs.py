@@ -0,0 +1,139 @@
+import subprocess, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from pathlib import Path
+
+class ToolError(Exception):
+    """
+    Raised when an external tool exits unsuccessfully, times out or cannot be started.
+    """
+    def __init__(self, result):
+        super().__init__(f"{result.name} failed: {result.summary()}")
+        self.result = result
+
+class JobResult:
+    """
+    The outcome of a single external tool invocation.
+    """
+    def __init__(self, args, returncode, stdout, stderr, duration, timed_out = False):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+        self.timed_out = timed_out
+
+    @property
+    def name(self):
+        return Path(str(self.args[0])).name
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+    def summary(self):
+        if self.timed_out:
+            return f"timed out after {self.duration:.2f}s"
+        if self.returncode is None:
+            return f"could not be started ({self.stderr.strip()})"
+        return f"exit code {self.returncode} in {self.duration:.2f}s"
+
+class ToolScheduler:
+    """
+    Runs external tools (Yabber, Yabber.DCX, texconv) with a cap on how many
+    processes run at once and a per-job timeout. Every job's result, including
+    its captured stdout and stderr, is appended to self.log.
+
+    Tool invocations can be run in the calling thread with run(), or queued on
+    the scheduler's background threads with submit() / submit_tool() so that,
+    for example, the next file unpacks while the current one is parsed.
+
+    Args:
+        max_jobs (int): Maximum number of tool processes running at once. Defaults to the CPU count.
+        timeout (float): Default per-job timeout in seconds, None for no limit.
+    """
+    def __init__(self, max_jobs = None, timeout = None):
+        self.max_jobs = max_jobs or cpu_count() or 1
+        self.timeout = timeout
+        self.log = []
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+        self._log_lock = threading.Lock()
+        # Background tasks may mix Python work with tool runs, so allow more
+        # threads than process slots.
+        self._executor = ThreadPoolExecutor(max_workers = self.max_jobs * 2)
+
+    def run(self, args, timeout = None, cwd = None, check = True):
+        """
+        Runs a tool in the calling thread once a process slot is free.
+
+        Args:
+            args (list): Executable followed by its arguments (str or Path).
+            timeout (float): Overrides the scheduler's default timeout.
+            cwd (str): Working directory for the process.
+            check (bool): Raise ToolError if the tool does not succeed.
+
+        Returns:
+            JobResult: The finished job.
+        """
+        args = [str(arg) for arg in args]
+        if timeout is None:
+            timeout = self.timeout
+
+        with self._slots:
+            time_start = time.perf_counter()
+            try:
+                # stdin is closed so tools waiting for a key press on error exit instead of hanging.
+                completed = subprocess.run(
+                    args,
+                    cwd = cwd,
+                    stdin = subprocess.DEVNULL,
+                    stdout = subprocess.PIPE,
+                    stderr = subprocess.PIPE,
+                    timeout = timeout)
+                result = JobResult(args, completed.returncode, decode(completed.stdout),
+                                   decode(completed.stderr), time.perf_counter() - time_start)
+            except subprocess.TimeoutExpired as e:
+                result = JobResult(args, None, decode(e.stdout), decode(e.stderr),
+                                   time.perf_counter() - time_start, timed_out = True)
+            except OSError as e:
+                result = JobResult(args, None, "", str(e), time.perf_counter() - time_start)
+
+        self._record(result)
+        if check and not result.ok:
+            raise ToolError(result)
+        return result
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Runs function(*args, **kwargs) on a background thread.
+
+        Returns:
+            Future: Resolves to the function's return value.
+        """
+        return self._executor.submit(function, *args, **kwargs)
+
+    def submit_tool(self, args, timeout = None, cwd = None, check = True):
+        """
+        Queues a tool invocation on a background thread.
+
+        Returns:
+            Future: Resolves to the JobResult, or raises ToolError if check is set.
+        """
+        return self.submit(self.run, args, timeout = timeout, cwd = cwd, check = check)
+
+    def shutdown(self, wait = True):
+        self._executor.shutdown(wait = wait)
+
+    def _record(self, result):
+        with self._log_lock:
+            self.log.append(result)
+        print(f"{result.name}: {result.summary()}")
+        if not result.ok and result.stderr:
+            print(result.stderr.rstrip())
+
+def decode(output):
+    if output is None:
+        return ""
+    if isinstance(output, str):
+        return output
+    return output.decode(errors = "replace")
@@ -0,0 +1,60 @@
+import hashlib, json, os, time
+from pathlib import Path
+
+class ImportJournal:
+    """
+    Records the outcome of each file of a batch import, so a batch that was
+    interrupted or had failures can be resumed without importing its
+    completed files again. There is one journal per source directory, kept
+    in the unpack directory's "journals" folder and saved after every file.
+
+    Each file's entry has a status ("completed", "failed" or "skipped"), the
+    error message for failed files and the time it was recorded.
+
+    Args:
+        root (Path): The user's unpack directory.
+        directory (Path): Directory the batch's files are imported from.
+        resume (bool): Continue the directory's previous journal instead of starting a new one.
+    """
+    def __init__(self, root, directory, resume = False):
+        self.directory = str(Path(directory).resolve())
+        key = hashlib.sha1(self.directory.encode()).hexdigest()[:16]
+        self.path = Path(root) / "journals" / f"{key}.json"
+        self.path.parent.mkdir(parents = True, exist_ok = True)
+        self.files = {}
+        if resume:
+            try:
+                with open(self.path, "r") as file:
+                    self.files = json.load(file)["files"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def get(self, file_name):
+        """
+        Returns the file's entry, or None if the journal has no record of it.
+        """
+        return self.files.get(file_name)
+
+    def is_done(self, file_name):
+        entry = self.files.get(file_name)
+        return entry is not None and entry["status"] in ("completed", "skipped")
+
+    def record(self, file_name, status, error = None):
+        self.files[file_name] = {"status": status, "error": error, "time": time.time()}
+        self._save()
+
+    def counts(self, file_names = None):
+        """
+        Returns the number of files by status, counting only file_names if given.
+        """
+        counts = {"completed": 0, "failed": 0, "skipped": 0}
+        for file_name, entry in self.files.items():
+            if file_names is None or file_name in file_names:
+                counts[entry["status"]] += 1
+        return counts
+
+    def _save(self):
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as file:
+            json.dump({"directory": self.directory, "files": self.files}, file, indent = 1)
+        os.replace(temp_path, self.path)
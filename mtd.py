@@ -0,0 +1,267 @@
+import hashlib, json, re, struct
+from pathlib import Path, PureWindowsPath
+from . import bnd, dcx
+
+# Material libraries in the order games name them, relative to the game directory.
+LIBRARY_PATHS = (
+    "mtd/allmaterialbnd.mtdbnd.dcx",  # DS3, Bloodborne, Sekiro
+    "mtd/Mtd.mtdbnd.dcx",  # DS1 Remastered
+    "mtd/Mtd.mtdbnd",  # DS1
+)
+
+# Texture roles by MTD/FLVER texture type, with the "Texture" suffix and layer number removed.
+TEXTURE_ROLES = {
+    "g_diffuse": "albedo",
+    "g_specular": "specular",
+    "g_metallic": "metallic",
+    "g_emissive": "emissive",
+    "g_bumpmap": "normal",
+}
+
+# Fallback for textures without a usable type: roles by file name suffix, e.g. "c1234_n".
+SUFFIX_ROLES = {
+    "a": "albedo",
+    "r": "specular",
+    "m": "metallic",
+    "em": "emissive",
+    "n": "normal",
+}
+
+TEXTURE_TYPE_PATTERN = re.compile(r"(g_[a-z]+?)(?:texture)?(_?\d*)")
+
+def texture_role(type_name):
+    """
+    Returns the role ("albedo", "specular", "metallic", "emissive" or "normal") of a texture type
+    such as "g_DiffuseTexture" or "g_Bumpmap", or None for unused types and second layer textures.
+    """
+    match = TEXTURE_TYPE_PATTERN.fullmatch(type_name.lower())
+    if match is None or match.group(2) not in ("", "0", "_0"):
+        return None
+    return TEXTURE_ROLES.get(match.group(1))
+
+def suffix_role(texture_name):
+    parts = texture_name.lower().rsplit("_", 1)
+    return SUFFIX_ROLES.get(parts[1]) if len(parts) == 2 else None
+
+def mtd_name(mtd_path):
+    """
+    Returns the library key of a material's mtd path, e.g. "N:\\...\\P[ARSN].mtd" -> "p[arsn]".
+    """
+    return PureWindowsPath(mtd_path).stem.lower()
+
+class MTDTexture:
+    """
+    A texture slot of an MTD.
+    """
+    def __init__(self, type, uv_number, shader_data_index, path = ""):
+        self.type = type
+        self.uv_number = uv_number
+        self.shader_data_index = shader_data_index
+        self.path = path  # Default texture, only in newer MTDs
+
+class MTD:
+    """
+    A material definition: the shader a FLVER material uses, its parameters and its texture slots.
+    """
+    def __init__(self, shader_path, description, params, textures):
+        self.shader_path = shader_path
+        self.description = description
+        self.params = params  # dict of param name to value
+        self.textures = textures  # list of MTDTexture
+
+    @property
+    def blend_mode(self):
+        """
+        Blender blend method for materials using this MTD, from the game's naming convention.
+        """
+        name = PureWindowsPath(self.shader_path).stem.lower() + "|" + self.description.lower()
+        if "_edge" in name:
+            return "CLIP"
+        if "_alp" in name or "_add" in name:
+            return "HASHED"
+        return "OPAQUE"
+
+    def to_dict(self):
+        return {
+            "shader_path": self.shader_path,
+            "description": self.description,
+            "params": self.params,
+            "textures": [[t.type, t.uv_number, t.shader_data_index, t.path] for t in self.textures],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["shader_path"], data["description"], data["params"],
+                   [MTDTexture(*texture) for texture in data["textures"]])
+
+class MaterialLibrary:
+    """
+    Every MTD of a game, parsed once from its material binder and cached as
+    JSON in the unpack directory so later sessions skip the parsing.
+
+    Args:
+        materials (dict): MTD objects by mtd_name().
+    """
+    def __init__(self, materials):
+        self.materials = materials
+
+    def get(self, mtd_path):
+        """
+        Returns the MTD for a FLVER material's mtd path, or None if the library has no such material.
+        """
+        return self.materials.get(mtd_name(mtd_path))
+
+    @classmethod
+    def load(cls, game_path, cache_dir):
+        """
+        Loads the material library of the game installed at game_path.
+
+        Args:
+            game_path (Path): The game directory.
+            cache_dir (Path): Directory for the parsed library cache.
+
+        Returns:
+            MaterialLibrary: The library, or None if the game has no readable material binder.
+        """
+        source = next((Path(game_path) / path for path in LIBRARY_PATHS if (Path(game_path) / path).is_file()), None)
+        if source is None:
+            return None
+        source = source.resolve()
+        stat = source.stat()
+        cache_path = Path(cache_dir) / f"materials-{hashlib.sha1(str(source).encode()).hexdigest()[:16]}.json"
+        try:
+            with open(cache_path, "r") as file:
+                cached = json.load(file)
+            if cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+                return cls({name: MTD.from_dict(data) for name, data in cached["materials"].items()})
+        except (OSError, ValueError, KeyError):
+            pass
+
+        try:
+            binder = bnd.read_binder(dcx.read_file(source))
+        except dcx.UnsupportedCompression as e:
+            print(f"Cannot read material library {source}: {e}")
+            return None
+        materials = {}
+        for file in binder.files:
+            if file.name is None or not file.name.lower().endswith(".mtd"):
+                continue
+            try:
+                materials[mtd_name(file.name)] = read_mtd(binder.read(file))
+            except (AssertionError, struct.error, UnicodeDecodeError) as e:
+                print(f"Failed to read {file.name}: {e}")
+        print(f"Read {len(materials)} materials from {source}")
+
+        cache_path.parent.mkdir(parents = True, exist_ok = True)
+        with open(cache_path, "w") as file:
+            json.dump({
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "materials": {name: material.to_dict() for name, material in materials.items()},
+            }, file)
+        return cls(materials)
+
+class _Reader:
+    # Little endian reader over an in-memory MTD, following SoulsFormats' MTD block layout.
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from("<" + fmt, self.data, self.position)
+        self.position += struct.calcsize("<" + fmt)
+        return values
+
+    def int32(self):
+        return self.unpack("i")[0]
+
+    def pad(self):
+        self.position += -self.position % 4
+
+    def marker(self, expected):
+        marker = self.data[self.position]
+        assert marker == expected, f"Expected marker {expected:#x}, got {marker:#x} at {self.position:#x}"
+        self.position += 1
+        self.pad()
+
+    def string(self, marker):
+        length = self.int32()
+        value = bytes(self.data[self.position:self.position + length]).decode("shift_jis")
+        self.position += length
+        self.marker(marker)
+        return value
+
+    def block(self):
+        # Returns the block's end offset and version.
+        assert self.int32() == 0
+        length = self.int32()
+        start = self.position
+        type, version = self.unpack("ii")
+        self.position += 1  # Marker
+        self.pad()
+        return start + length, version
+
+PARAM_FORMATS = {
+    "bool": "?",
+    "int": "i",
+    "int2": "2i",
+    "float": "f",
+    "float2": "2f",
+    "float3": "3f",
+    "float4": "4f",
+    "float5": "5f",
+}
+
+def read_mtd(data):
+    """
+    Parses an MTD file.
+
+    Args:
+        data (bytes): The MTD file's contents.
+
+    Returns:
+        MTD: The material definition.
+    """
+    reader = _Reader(data)
+    file_end, _ = reader.block()
+    header_end, _ = reader.block()
+    assert reader.string(0x34) == "MTD "
+    reader.position = header_end
+    reader.marker(0x01)
+
+    data_end, _ = reader.block()
+    shader_path = reader.string(0xA3)
+    description = reader.string(0x03)
+    reader.int32()
+    lists_end, _ = reader.block()
+    reader.int32()
+    reader.marker(0x03)
+
+    params = {}
+    for _ in range(reader.int32()):
+        param_end, _ = reader.block()
+        name = reader.string(0xA3)
+        type = reader.string(0x04).lower()
+        reader.int32()
+        reader.block()
+        reader.int32()  # Value count, always 1
+        values = reader.unpack(PARAM_FORMATS[type]) if type in PARAM_FORMATS else ()
+        params[name] = values[0] if len(values) == 1 else list(values)
+        reader.position = param_end
+
+    reader.marker(0x03)
+    textures = []
+    for _ in range(reader.int32()):
+        texture_end, version = reader.block()
+        type = reader.string(0x35)
+        uv_number = reader.int32()
+        reader.marker(0x35)
+        shader_data_index = reader.int32()
+        path = ""
+        if version == 5:
+            reader.int32()
+            path = reader.string(0xBA)
+        textures.append(MTDTexture(type, uv_number, shader_data_index, path))
+        reader.position = texture_end
+
+    return MTD(shader_path, description, params, textures)
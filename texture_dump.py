@@ -0,0 +1,48 @@
+"""
+Extracts every texture of a game install (or any directory of tpf and
+texbnd files) as dds, or png with --png, without Blender.
+
+    python texture_dump.py <directory> <output directory> [--png] [--workers N]
+
+Interrupted runs resume where they stopped; see tpf.unpack_all.
+"""
+import argparse, os, sys, time
+
+if __package__ in (None, ""):
+    # Run as a script: load the add-on's modules as a package without
+    # executing its __init__, which needs Blender. Worker processes re-run
+    # this when they import the main module.
+    import types
+    _package = types.ModuleType("fromsoft_blender_importer")
+    _package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules.setdefault("fromsoft_blender_importer", _package)
+    from fromsoft_blender_importer import tpf
+    from fromsoft_blender_importer.jobs import ToolScheduler
+else:
+    from . import tpf
+    from .jobs import ToolScheduler
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Extract the textures of tpf and texbnd files.")
+    parser.add_argument("directory", help = "Directory to scan, e.g. the game's install directory")
+    parser.add_argument("output", help = "Directory to extract to; holds the resume manifest")
+    parser.add_argument("--png", action = "store_true", help = "Convert to png with texconv.exe instead of keeping dds")
+    parser.add_argument("--workers", type = int, default = None, help = "Worker processes (default: CPU count)")
+    parser.add_argument("--retry-failed", action = "store_true", help = "Retry files that failed in an earlier run")
+    args = parser.parse_args(args)
+
+    time_start = time.perf_counter()
+    scheduler = ToolScheduler(max_jobs = args.workers) if args.png else None
+    try:
+        extracted, skipped, failed = tpf.unpack_all(
+            args.directory, args.output, workers = args.workers, png = args.png, scheduler = scheduler,
+            retry_failed = args.retry_failed)
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown()
+    print(f"Done in {time.perf_counter() - time_start:.1f}s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    from fromsoft_blender_importer.texture_dump import main as package_main
+    sys.exit(package_main())
@@ -1,24 +1,41 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from os.path import isfile, join, splitext
-import subprocess, os
+import io, json, os, struct, time, zlib
+import numpy as np
 from pathlib import Path
+from . import bnd, dcx
+from .jobs import ToolScheduler
+
+# Bumped when convert_to_png's output changes, so earlier conversions are not reused.
+PNG_VERSION = 2
 
 class TPF:   
     """
     A container for texture files.
+
+    Args:
+        tpf_path (Path): The tpf file.
+        data (bytes): Contents of the tpf when it is already in memory (e.g. read from a binder),
+            in which case tpf_path is only used for naming.
     """
-    def __init__(self, tpf_path):
+    def __init__(self, tpf_path, data = None):
 
         self.tpf_path = tpf_path
+        self.raw = data
         self.textures = []
         self.file_path = str(self.tpf_path)[:-4]
         self.filenames = []
+        self.data_offsets = []
+        self.mipmap_counts = []
 
     def unpack(self):
         """
         Unpackes the textures files and appends them to self.textures.
         """
-        with open(self.tpf_path, "rb") as self.data:
-            signature = self.data.read(4)  # ".TPF "
+        with (io.BytesIO(self.raw) if self.raw is not None else open(self.tpf_path, "rb")) as self.data:
+            signature = self.data.read(4)
+            if signature != b"TPF\0":
+                raise Exception(f"Not a tpf file: {self.tpf_path}")
             net_file_size = int32(self.data.read(4))
             texture_count = int32(self.data.read(4))
 
@@ -32,7 +49,7 @@ class TPF:
                 data_size = int32(self.data.read(4))
                 format = self.data.read(1)
                 is_cube_map = self.data.read(1)
-                mipmap_count = self.data.read(1)
+                mipmap_count = self.data.read(1)[0]
                 flags = self.data.read(1)
 
                 # Changes here depending on game type
@@ -65,6 +82,8 @@ class TPF:
 
                 self.data.seek(position)
     
+                self.data_offsets.append(data_offset)
+                self.mipmap_counts.append(mipmap_count)
                 self.textures.append(result)
 
     def save_textures_to_file(self, file_path):
@@ -101,37 +120,338 @@ class TPF:
             print("Failed to decode {}".format(buffer))
             raise e
 
-def unpack_all(tpf_path):
+# Files unpack_all extracts textures from.
+TEXTURE_SUFFIXES = (".tpf", ".tpf.dcx", ".texbnd.dcx", ".texbnd")
+
+MANIFEST_NAME = "manifest.json"
+
+def unpack_all(source_path, output_path, workers = None, png = False, scheduler = None, retry_failed = False):
     """
-    Unpacks all tpf files in the tpf_path directory to dds files.
-    
+    Extracts the textures of every tpf, tpf.dcx and texbnd file below source_path as dds files, e.g.
+    "chr/c1234.texbnd.dcx" into "{output_path}/chr/c1234.texbnd/". Files are read and unpacked by a process
+    pool.
+
+    A manifest in output_path records each source's size, modification time and output files, and is saved as
+    work completes, so an interrupted run resumes where it stopped: sources whose outputs are up to date, or
+    that failed before and have not changed since, are skipped.
+
     Args:
-        Directory in which to look for .tpf files.
+        source_path (Path): Directory to scan, e.g. the game directory.
+        output_path (Path): Directory to extract to.
+        workers (int): Worker processes. Defaults to the CPU count.
+        png (bool): Also convert the textures to png with texconv (see convert_to_png), removing the dds files.
+        scheduler (ToolScheduler): Runs texconv. A private one is used if not given.
+        retry_failed (bool): Try sources that failed in an earlier run again.
+
+    Returns:
+        tuple: Number of sources extracted, skipped as up to date and failed.
+    """
+    source_path = Path(source_path)
+    output_path = Path(output_path)
+    os.makedirs(output_path, exist_ok = True)
+    manifest_path = output_path / MANIFEST_NAME
+    try:
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+    owned_scheduler = png and scheduler is None
+    if owned_scheduler:
+        scheduler = ToolScheduler()
+
+    pending = []
+    skipped = 0
+    for dirpath, subdirs, files in os.walk(source_path):
+        for file_name in files:
+            if not file_name.lower().endswith(TEXTURE_SUFFIXES):
+                continue
+            source = Path(dirpath) / file_name
+            relative = source.relative_to(source_path).as_posix()
+            stat = source.stat()
+            entry = manifest.get(relative)
+            target = output_path / texture_dir_name(relative)
+            if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns \
+                    and entry["png"] == png and (entry["error"] is None or not retry_failed) \
+                    and all(isfile(target / name) for name in entry["files"]):
+                skipped += 1
+                continue
+            pending.append((relative, source, target, stat))
+
+    extracted = failed = 0
+    last_save = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            jobs = {executor.submit(extract_textures, source, target): (relative, target, stat)
+                    for relative, source, target, stat in pending}
+            for job in as_completed(jobs):
+                relative, target, stat = jobs[job]
+                files, error = job.result()
+                if error is None and png and files:
+                    convert_to_png(target, scheduler)
+                    files = sorted(f for f in os.listdir(target) if f.endswith(".png"))
+                if error is None:
+                    extracted += 1
+                else:
+                    failed += 1
+                    print(f"Failed to extract {relative}: {error}")
+                manifest[relative] = {
+                    "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "png": png, "files": files, "error": error}
+                if time.monotonic() - last_save > 10:
+                    save_manifest(manifest_path, manifest)
+                    last_save = time.monotonic()
+    finally:
+        save_manifest(manifest_path, manifest)
+        if owned_scheduler:
+            scheduler.shutdown()
+    print(f"Textures: {extracted} files extracted, {failed} failed, {skipped} skipped as up to date or failed before")
+    return extracted, skipped, failed
+
+def texture_dir_name(relative):
+    # "chr/c1234.texbnd.dcx" -> "chr/c1234.texbnd"
+    return relative[:-4] if relative.lower().endswith(".dcx") else relative
+
+def extract_textures(source, target):
     """
-    files = [f for f in os.listdir(tpf_path) if isfile(join(tpf_path, f))]
-    for file in files:
-        tpf.unpack()
-        tpf.save_textures_to_file()
+    Writes the textures of one tpf or texbnd file to target as dds files. Runs in unpack_all's worker processes.
 
-def convert_to_png(tpf_path):
+    Returns:
+        tuple: The written file names, and an error message if the file could not be read (None otherwise).
+    """
+    try:
+        data = dcx.read_file(source)
+        if bnd.is_binder(data):
+            binder = bnd.read_binder(data)
+            members = [(file.name, binder.read(file)) for file in binder.files
+                       if file.name is not None and file.name.lower().endswith(".tpf")]
+        else:
+            members = [(str(source), data)]
+        names = []
+        for name, member in members:
+            tpf = TPF(name, data = member)
+            tpf.unpack()
+            os.makedirs(target, exist_ok = True)
+            for texture_name, texture in zip(tpf.filenames, tpf.textures):
+                names.append(texture_name.rstrip() + ".dds")
+                with open(Path(target) / names[-1], "wb") as file:
+                    file.write(texture)
+        return sorted(set(names)), None
+    except dcx.UnsupportedCompression as e:
+        return [], str(e)
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+def save_manifest(manifest_path, manifest):
+    # Written to a temporary file first so an interrupted save keeps the previous manifest.
+    temp_path = Path(str(manifest_path) + ".tmp")
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent = 1)
+    os.replace(temp_path, manifest_path)
+
+def convert_to_png(tpf_path, scheduler = None, normal_maps = None, mip_level = 0):
     """
     Invokes the DirectXTex texture converter executable to convert dds files
     in the directory to png files, then deletes the old dds file.
+    Conversions run concurrently through the scheduler. Normal maps are
+    split by convert_normal_map instead.
+
+    With a mip_level, reduced size previews are written to a "mip{mip_level}"
+    subdirectory instead and the dds files are kept, so that calling this
+    again without mip_level later converts them at full resolution.
 
     Args:
         Directory in which to look for .dds files.
+        ToolScheduler used to run texconv. A private one is used if not given.
+        Names (without extension) of the normal maps. Defaults to textures named "*_n".
+        Mip level to convert for previews, 0 for full resolution.
+
+    Returns:
+        Path: The directory containing the png files.
     """
-    dds_files = [f for f in os.listdir(tpf_path) if f.endswith('.dds')]
+    if scheduler is None:
+        scheduler = ToolScheduler()
+        try:
+            return convert_to_png(tpf_path, scheduler, normal_maps, mip_level)
+        finally:
+            scheduler.shutdown()
+    if normal_maps is None:
+        normal_maps = {splitext(f)[0] for f in os.listdir(tpf_path) if splitext(f)[0].lower().endswith("_n")}
+    normal_maps = {name.lower() for name in normal_maps}
+    source_path = Path(tpf_path)
+    tpf_path = source_path
+    if mip_level > 0:
+        tpf_path = source_path / f"mip{mip_level}"
+        os.makedirs(tpf_path, exist_ok = True)
+    sys_path = Path(os.path.dirname(os.path.realpath(__file__)))
+    dds_files = [f for f in os.listdir(source_path) if f.endswith('.dds')]
+    jobs = []
     for dds_file in dds_files:
         if isfile(join(tpf_path, f'{splitext(dds_file)[0]}.png')):
-            os.remove(tpf_path / dds_file)
-            return
-        sys_path = os.path.dirname(os.path.realpath(__file__))
-        command = f'"{sys_path}\\texconv.exe" "{tpf_path / dds_file}" -ft png -o "{tpf_path}" -y'
+            if mip_level == 0:
+                os.remove(tpf_path / dds_file)
+            continue
+        if mip_level > 0:
+            with open(source_path / dds_file, "rb") as file:
+                preview = select_mip(file.read(), mip_level)
+            with open(tpf_path / dds_file, "wb") as file:
+                file.write(preview)
+        if splitext(dds_file)[0].lower() in normal_maps:
+            jobs.append((dds_file, scheduler.submit(convert_normal_map, tpf_path / dds_file, scheduler)))
+            continue
         # I haven't been able to find a way to convert the dds files that DS3 uses from within python,
         # So currently this is the most consistent method, as texconv covers many versions of dds files.
-        subprocess.run(command, shell = False, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        command = [sys_path / "texconv.exe", tpf_path / dds_file, "-ft", "png", "-o", tpf_path, "-y"]
+        jobs.append((dds_file, scheduler.submit_tool(command, check = False)))
+    for dds_file, job in jobs:
+        job.result()
         os.remove(tpf_path / dds_file)
+    return tpf_path
+
+def convert_normal_map(dds_path, scheduler):
+    """
+    Converts a normal map into two png files next to it: {name}.png with the
+    normal's z reconstructed from x and y, ready for a Normal Map node, and
+    {name}_spec.png holding the blue channel, which the games use for
+    specular level rather than z.
+
+    Args:
+        dds_path (Path): The normal map.
+        scheduler (ToolScheduler): Runs texconv.
+    """
+    dds_path = Path(dds_path)
+    sys_path = Path(os.path.dirname(os.path.realpath(__file__)))
+    # texconv only decompresses here (top mip, 8 bit RGBA); the channel work is done on the pixels.
+    scheduler.run([sys_path / "texconv.exe", dds_path, "-ft", "dds", "-f", "R8G8B8A8_UNORM", "-m", "1",
+                   "-sx", "_rgba", "-o", dds_path.parent, "-y"], check = False)
+    rgba_path = dds_path.parent / f"{dds_path.stem}_rgba.dds"
+    if not isfile(rgba_path):
+        return
+    pixels = read_dds_rgba(rgba_path)
+    os.remove(rgba_path)
+    normal, specular = split_normal_map(pixels)
+    write_png(dds_path.parent / f"{dds_path.stem}.png", normal)
+    write_png(dds_path.parent / f"{dds_path.stem}_spec.png", specular)
+
+# Bytes per 4x4 block of block compressed formats, by legacy FourCC and by DXGI format.
+BLOCK_SIZES = {b"DXT1": 8, b"DXT2": 16, b"DXT3": 16, b"DXT4": 16, b"DXT5": 16, b"ATI1": 8, b"BC4U": 8,
+               b"BC4S": 8, b"ATI2": 16, b"BC5U": 16, b"BC5S": 16}
+DXGI_BLOCK_SIZES = {**dict.fromkeys(range(70, 73), 8), **dict.fromkeys(range(73, 79), 16),
+                    **dict.fromkeys(range(79, 82), 8), **dict.fromkeys(range(82, 85), 16),
+                    **dict.fromkeys(range(94, 100), 16)}
+# Bytes per pixel of common uncompressed DXGI formats.
+DXGI_PIXEL_SIZES = {**dict.fromkeys(range(27, 33), 4), **dict.fromkeys(range(87, 94), 4),
+                    **dict.fromkeys(range(2, 5), 16), **dict.fromkeys(range(10, 15), 8)}
+
+def select_mip(dds, mip_level):
+    """
+    Drops the mip levels above mip_level from a dds file, giving a smaller
+    texture without decoding it. The level is clamped to the smallest mip.
+    Cube maps, texture arrays, volume textures and unknown formats are
+    returned unchanged.
+
+    Args:
+        dds (bytes): A complete dds file.
+        mip_level (int): The mip level that becomes the new top level.
+
+    Returns:
+        bytes: The reduced dds file.
+    """
+    height, width, _, depth, mip_count = struct.unpack_from("<IIIII", dds, 12)
+    four_cc = dds[84:88]
+    caps2, = struct.unpack_from("<I", dds, 112)
+    mip_level = min(mip_level, max(mip_count, 1) - 1)
+    if mip_level <= 0 or caps2 & 0x200 or caps2 & 0x200000: # Cube map, volume texture
+        return dds
+
+    header_size = 128
+    if four_cc == b"DX10":
+        header_size = 148
+        dxgi_format, _, misc_flags, array_size = struct.unpack_from("<IIII", dds, 128)
+        if misc_flags & 0x4 or array_size > 1:
+            return dds
+        block_size = DXGI_BLOCK_SIZES.get(dxgi_format)
+        pixel_size = DXGI_PIXEL_SIZES.get(dxgi_format)
+    else:
+        block_size = BLOCK_SIZES.get(four_cc)
+        pixel_flags, bit_count = struct.unpack_from("<I4xI", dds, 80)
+        pixel_size = bit_count // 8 if pixel_flags & 0x40 and four_cc == b"\0\0\0\0" else None
+    if block_size is None and not pixel_size:
+        return dds
+
+    def level_size(level):
+        level_width, level_height = max(1, width >> level), max(1, height >> level)
+        if block_size is not None:
+            return ((level_width + 3) // 4) * ((level_height + 3) // 4) * block_size
+        return level_width * level_height * pixel_size
+
+    skipped = sum(level_size(level) for level in range(mip_level))
+    header = bytearray(dds[:header_size])
+    struct.pack_into("<II", header, 12, max(1, height >> mip_level), max(1, width >> mip_level))
+    struct.pack_into("<I", header, 28, mip_count - mip_level)
+    if block_size is not None:
+        struct.pack_into("<I", header, 20, level_size(mip_level)) # Linear size of the top level
+    else:
+        struct.pack_into("<I", header, 20, max(1, width >> mip_level) * pixel_size) # Row pitch
+    return bytes(header) + dds[header_size + skipped:]
+
+def split_normal_map(pixels, rows = 512):
+    """
+    Splits an RGBA normal map into an RGB normal map with reconstructed z and a single channel specular map.
+
+    Args:
+        pixels (ndarray): (height, width, 4) uint8 array, x and y in red and green.
+        rows (int): Rows processed at once, bounding the float temporaries.
+
+    Returns:
+        tuple: (height, width, 3) and (height, width, 1) uint8 arrays.
+    """
+    normal = np.empty(pixels.shape[:2] + (3,), np.uint8)
+    normal[..., :2] = pixels[..., :2]
+    for start in range(0, len(pixels), rows):
+        xy = pixels[start:start + rows, :, :2].astype(np.float32) / 127.5 - 1.0
+        z = np.sqrt(np.clip(1.0 - np.einsum("...i,...i", xy, xy), 0.0, 1.0))
+        normal[start:start + rows, :, 2] = np.rint((z + 1.0) * 127.5)
+    return normal, np.ascontiguousarray(pixels[..., 2:3])
+
+def read_dds_rgba(path):
+    """
+    Reads the top mip of an uncompressed 8 bit RGBA or BGRA dds file.
+
+    Returns:
+        ndarray: (height, width, 4) uint8 array in RGBA order.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:4] != b"DDS ":
+        raise Exception(f"Not a dds file: {path}")
+    height, width = struct.unpack_from("<II", data, 12)
+    four_cc = data[84:88]
+    offset = 148 if four_cc == b"DX10" else 128
+    pixels = np.frombuffer(data, np.uint8, height * width * 4, offset).reshape(height, width, 4)
+    red_mask, = struct.unpack_from("<I", data, 92)
+    if four_cc != b"DX10" and red_mask == 0x00FF0000:
+        pixels = pixels[..., (2, 1, 0, 3)]
+    return np.ascontiguousarray(pixels)
+
+def write_png(path, pixels):
+    """
+    Writes an 8 bit grayscale, RGB or RGBA png file.
+
+    Args:
+        path (Path): Output file.
+        pixels (ndarray): (height, width, channels) uint8 array with 1, 3 or 4 channels.
+    """
+    height, width, channels = pixels.shape
+    color_type = {1: 0, 3: 2, 4: 6}[channels]
+    scanlines = np.zeros((height, width * channels + 1), np.uint8) # Filter type 0 at the start of each row
+    scanlines[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6)))
+        file.write(chunk(b"IEND", b""))
 
 def int32(data):
     return int.from_bytes(data, byteorder= "little", signed = True)
@@ -0,0 +1,215 @@
+import hashlib, json, os, threading, time
+from pathlib import Path
+from shutil import copyfile, rmtree
+
+class Workspace:
+    """
+    Manages the unpack directory. Each extracted file lives in its own entry,
+    keyed by the source's path, size and modification time, so importing an
+    unchanged file again reuses the earlier extraction. When the entries grow
+    past the disk budget, the least recently used ones are deleted.
+
+    Entries that must outlive the import (textures Blender images point to)
+    are kept regardless of the budget, unless referenced says no image uses
+    them any more.
+
+    Args:
+        root (Path): The user's unpack directory.
+        budget (int): Disk budget in bytes for all entries, None for no limit.
+        referenced (set): Names of the entry directories Blender images currently load files from, if known.
+    """
+    manifest_name = "workspace.json"
+
+    def __init__(self, root, budget = None, referenced = None):
+        self.root = Path(root)
+        self.budget = budget
+        self.root.mkdir(parents = True, exist_ok = True)
+        self._lock = threading.Lock()
+        self._in_progress = {}
+        self._pinned = {}
+        self._referenced = referenced
+        self._entries = self._load_manifest()
+        if referenced is not None:
+            for entry in self._entries.values():
+                if entry["directory"] not in referenced:
+                    entry["evictable"] = True
+
+    def extract(self, source, extract, stage = True, evictable = True, tag = "", supersedes = None):
+        """
+        Returns the entry directory for source, calling extract to fill it if
+        there is no complete extraction of the current version of the file.
+        The entry is pinned (never evicted) until release() is called.
+
+        Args:
+            source (Path): The file to extract.
+            extract (callable): extract(input_path, entry_dir) writes the extracted files into entry_dir.
+            stage (bool): Whether the tool needs the input inside entry_dir (as Yabber writes next to its input).
+                The input is hard-linked there when possible, falling back to a copy; otherwise extract reads
+                the source in place.
+            evictable (bool): False for entries that must outlive the import, such as textures Blender images point to.
+            tag (str): Distinguishes different extractions of the same source, e.g. its model and its textures.
+            supersedes (str): Once the new entry is complete, earlier entries of the same source whose tag starts
+                with this are deleted (or left to the budget, if an image still uses them), e.g. textures
+                converted from an older version of the file.
+
+        Returns:
+            Path: The entry directory.
+        """
+        source = Path(source).resolve()
+        stat = source.stat()
+        key = hashlib.sha1(f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{tag}".encode()).hexdigest()[:16]
+        entry_dir = self.root / f"{source.name.split('.')[0]}-{key}"
+
+        while True:
+            with self._lock:
+                self._pinned[key] = self._pinned.get(key, 0) + 1
+                entry = self._entries.get(key)
+                if entry is not None and entry["complete"] and entry_dir.is_dir():
+                    entry["last_used"] = time.time()
+                    entry["evictable"] = evictable
+                    self._save_manifest()
+                    print(f"Reusing extracted {source.name} from {entry_dir}")
+                    return entry_dir
+                waiting = self._in_progress.get(key)
+                if waiting is None:
+                    self._in_progress[key] = threading.Event()
+                    break
+                self._pinned[key] -= 1
+            waiting.wait()
+
+        try:
+            if entry_dir.exists():
+                rmtree(entry_dir)  # Leftovers of an interrupted extraction
+            entry_dir.mkdir(parents = True)
+            if stage:
+                input_path = entry_dir / source.name
+                try:
+                    os.link(source, input_path)
+                except OSError:
+                    copyfile(source, input_path)
+                extract(input_path, entry_dir)
+                input_path.unlink()
+            else:
+                extract(source, entry_dir)
+        except BaseException:
+            with self._lock:
+                self._pinned[key] -= 1
+                self._in_progress.pop(key).set()
+            rmtree(entry_dir, ignore_errors = True)
+            raise
+
+        with self._lock:
+            self._entries[key] = {
+                "directory": entry_dir.name,
+                "source": str(source),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "bytes": directory_size(entry_dir),
+                "last_used": time.time(),
+                "complete": True,
+                "evictable": evictable,
+                "tag": tag,
+            }
+            self._in_progress.pop(key).set()
+            if supersedes is not None:
+                self._supersede(key, str(source), supersedes)
+            self._evict()
+            self._save_manifest()
+        return entry_dir
+
+    def release(self, entry_dir):
+        """
+        Unpins an entry returned by extract(), allowing it to be evicted.
+        """
+        key = self._key(entry_dir)
+        with self._lock:
+            if self._pinned.get(key, 0) > 0:
+                self._pinned[key] -= 1
+            self._evict()
+            self._save_manifest()
+
+    def discard(self, entry_dir):
+        """
+        Deletes an entry, e.g. when files should not be kept after import or the extraction turned out unusable.
+        """
+        key = self._key(entry_dir)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._pinned.pop(key, None)
+            self._save_manifest()
+        rmtree(entry_dir, ignore_errors = True)
+
+    def refresh_size(self, path):
+        """
+        Recomputes the size of the entry holding path, after files were added to it outside extract().
+        """
+        try:
+            name = Path(path).resolve().relative_to(self.root.resolve()).parts[0]
+        except (ValueError, IndexError):
+            return
+        key = self._key(name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["bytes"] = directory_size(self.root / entry["directory"])
+                self._evict()
+                self._save_manifest()
+
+    def _supersede(self, new_key, source, prefix):
+        # Must hold self._lock.
+        for key, entry in list(self._entries.items()):
+            if key == new_key or entry["source"] != source or not entry.get("tag", "").startswith(prefix) \
+                    or self._pinned.get(key, 0) > 0 or key in self._in_progress:
+                continue
+            if self._referenced is not None and entry["directory"] not in self._referenced:
+                print(f"Removing superseded {entry['directory']} from the unpack directory")
+                rmtree(self.root / entry["directory"], ignore_errors = True)
+                del self._entries[key]
+            else:
+                entry["evictable"] = True
+
+    def _evict(self):
+        # Must hold self._lock.
+        if self.budget is None:
+            return
+        total = sum(entry["bytes"] for entry in self._entries.values() if entry.get("evictable", True))
+        for key, entry in sorted(self._entries.items(), key = lambda item: item[1]["last_used"]):
+            if total <= self.budget:
+                break
+            if not entry.get("evictable", True) or self._pinned.get(key, 0) > 0 or key in self._in_progress:
+                continue
+            print(f"Evicting {entry['directory']} from the unpack directory")
+            rmtree(self.root / entry["directory"], ignore_errors = True)
+            total -= entry["bytes"]
+            del self._entries[key]
+
+    def _key(self, entry_dir):
+        return Path(entry_dir).name.rsplit("-", 1)[-1]
+
+    def _load_manifest(self):
+        try:
+            with open(self.root / self.manifest_name, "r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return {key: entry for key, entry in entries.items() if (self.root / entry["directory"]).is_dir()}
+
+    def _save_manifest(self):
+        # Must hold self._lock.
+        temp_path = self.root / (self.manifest_name + ".tmp")
+        with open(temp_path, "w") as file:
+            json.dump(self._entries, file, indent = 1)
+        os.replace(temp_path, self.root / self.manifest_name)
+
+def directory_size(path):
+    """
+    Returns the total size in bytes of all files below path.
+    """
+    total = 0
+    for dirpath, subdirs, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.stat(os.path.join(dirpath, file)).st_size
+            except OSError:
+                pass
+    return total